@@ -0,0 +1,171 @@
+# Write a synthetic sales_data.csv with the real export's schema and value domains, for benchmarking at sizes
+# the real data doesn't reach. Rows are generated and written a chunk at a time, so 50M rows need no more
+# memory than one chunk. The same seed always gives the same file.
+#
+#   python -m benchmarks.generate_sales sales_data.csv --rows 10M [--seed 0] [--chunk-size 1M]
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv
+
+from bikeshop_data import MONTHS
+
+COLUMNS = ['Date', 'Day', 'Month', 'Year', 'Customer_Age', 'Age_Group', 'Customer_Gender', 'Country', 'State',
+           'Product_Category', 'Sub_Category', 'Product', 'Order_Quantity', 'Unit_Cost', 'Unit_Price', 'Profit',
+           'Cost', 'Revenue']
+
+# Country -> states, with each country's share of the transactions
+STATES = {
+    'United States': ['California', 'Washington', 'Oregon', 'New York', 'Texas', 'Florida', 'Illinois', 'Ohio'],
+    'Australia': ['New South Wales', 'Victoria', 'Queensland', 'South Australia', 'Tasmania'],
+    'United Kingdom': ['England'],
+    'Canada': ['British Columbia', 'Ontario', 'Alberta'],
+    'Germany': ['Hessen', 'Nordrhein-Westfalen', 'Bayern', 'Hamburg', 'Saarland', 'Brandenburg'],
+    'France': ['Seine (Paris)', 'Seine Saint Denis', 'Nord', 'Hauts de Seine', 'Essonne', 'Yveline', 'Loiret'],
+}
+COUNTRY_SHARES = [0.34, 0.21, 0.12, 0.13, 0.10, 0.10]
+
+# Sub_Category -> (Product_Category, product base names, unit cost, unit price, variants); each base name is
+# sold in every variant (sizes or colors), which gives a catalogue about as large as the real one
+CATALOGUE = {
+    'Bike Racks': ('Accessories', ['Hitch Rack - 4-Bike'], 45, 120, ['']),
+    'Bike Stands': ('Accessories', ['All-Purpose Bike Stand'], 59, 159, ['']),
+    'Bottles and Cages': ('Accessories', ['Water Bottle - 30 oz.', 'Mountain Bottle Cage', 'Road Bottle Cage'], 3, 9, ['']),
+    'Cleaners': ('Accessories', ['Bike Wash - Dissolver'], 3, 8, ['']),
+    'Fenders': ('Accessories', ['Fender Set - Mountain'], 8, 22, ['']),
+    'Helmets': ('Accessories', ['Sport-100 Helmet'], 13, 35, [', Red', ', Blue', ', Black']),
+    'Hydration Packs': ('Accessories', ['Hydration Pack - 70 oz.'], 21, 55, ['']),
+    'Tires and Tubes': ('Accessories', ['Patch Kit/8 Patches', 'Mountain Tire Tube', 'Road Tire Tube', 'HL Mountain Tire',
+                                        'ML Road Tire', 'Touring Tire'], 2, 6, ['']),
+    'Mountain Bikes': ('Bikes', ['Mountain-100 Silver', 'Mountain-100 Black', 'Mountain-200 Silver',
+                                 'Mountain-200 Black', 'Mountain-400-W Silver', 'Mountain-500 Black'], 1266, 2049,
+                       [', 38', ', 40', ', 42', ', 44', ', 48']),
+    'Road Bikes': ('Bikes', ['Road-150 Red', 'Road-250 Black', 'Road-350-W Yellow', 'Road-550-W Yellow',
+                             'Road-650 Red', 'Road-750 Black'], 1083, 1700, [', 44', ', 48', ', 52', ', 58', ', 62']),
+    'Touring Bikes': ('Bikes', ['Touring-1000 Blue', 'Touring-2000 Blue', 'Touring-3000 Yellow'], 1482, 2384,
+                      [', 46', ', 50', ', 54', ', 60']),
+    'Caps': ('Clothing', ['AWC Logo Cap'], 7, 9, ['']),
+    'Gloves': ('Clothing', ['Half-Finger Gloves'], 9, 24, [', S', ', M', ', L']),
+    'Jerseys': ('Clothing', ['Long-Sleeve Logo Jersey', 'Short-Sleeve Classic Jersey'], 38, 54, [', S', ', M', ', L', ', XL']),
+    'Shorts': ('Clothing', ["Women's Mountain Shorts"], 26, 70, [', S', ', M', ', L']),
+    'Socks': ('Clothing', ['Racing Socks'], 3, 9, [', M', ', L']),
+    'Vests': ('Clothing', ['Classic Vest'], 24, 64, [', S', ', M', ', L']),
+}
+
+# Share of the transactions per category, and the most units ordered in one transaction
+CATEGORY_SHARES = {'Accessories': 0.63, 'Bikes': 0.17, 'Clothing': 0.20}
+MAX_ORDER_QUANTITY = {'Accessories': 32, 'Bikes': 4, 'Clothing': 32}
+
+YEARS = np.arange(2011, 2017)
+
+# 2011 and 2012 only had bike sales, as in the real export
+BIKES_ONLY_YEARS = (2011, 2012)
+
+
+def product_catalogue():
+    rows = []
+    for sub_category, (category, names, unit_cost, unit_price, variants) in CATALOGUE.items():
+        for position, name in enumerate(names):
+            # Vary the prices a little between the models of a sub-category
+            scale = 1 + 0.15 * position
+            for variant in variants:
+                rows.append((category, sub_category, name + variant, round(unit_cost * scale), round(unit_price * scale)))
+    catalogue = pd.DataFrame(rows, columns=['Product_Category', 'Sub_Category', 'Product', 'Unit_Cost', 'Unit_Price'])
+    # Every category gets its share of the transactions, spread evenly over its products
+    catalogue['weight'] = catalogue['Product_Category'].map(CATEGORY_SHARES) / catalogue.groupby(
+        'Product_Category')['Product'].transform('size')
+    return catalogue
+
+
+def age_groups(ages):
+    return np.select([ages < 25, ages < 35, ages < 65], ['Youth (<25)', 'Young Adults (25-34)', 'Adults (35-64)'],
+                     'Seniors (64+)')
+
+
+# One chunk of rows drawn with rng
+def sales_chunk(rows, rng, catalogue):
+    # Dates: later years sell more
+    years = rng.choice(YEARS, size=rows, p=np.arange(1, len(YEARS) + 1) / np.arange(1, len(YEARS) + 1).sum())
+    day_of_year = rng.integers(0, 365, size=rows)
+    dates = pd.to_datetime(years.astype(str), format='%Y') + pd.to_timedelta(day_of_year, unit='D')
+
+    # Products: bikes only in the early years
+    weights = catalogue['weight'].to_numpy()
+    products = rng.choice(len(catalogue), size=rows, p=weights / weights.sum())
+    bikes = np.flatnonzero(catalogue['Product_Category'].to_numpy() == 'Bikes')
+    early = np.isin(years, BIKES_ONLY_YEARS)
+    products[early] = rng.choice(bikes, size=early.sum(), p=weights[bikes] / weights[bikes].sum())
+    sold = catalogue.iloc[products].reset_index(drop=True)
+
+    # Customers and places
+    ages = np.clip(rng.normal(36, 11, size=rows).round(), 17, 87).astype(np.int64)
+    countries = rng.choice(list(STATES), size=rows, p=COUNTRY_SHARES)
+    states = np.empty(rows, dtype=object)
+    for country, country_states in STATES.items():
+        in_country = countries == country
+        states[in_country] = rng.choice(country_states, size=in_country.sum())
+
+    # Measures: whole-dollar unit prices, as in the real export
+    maximum = sold['Product_Category'].map(MAX_ORDER_QUANTITY).to_numpy()
+    quantity = rng.integers(1, maximum + 1)
+    unit_cost = sold['Unit_Cost'].to_numpy()
+    unit_price = sold['Unit_Price'].to_numpy()
+    cost = quantity * unit_cost
+    revenue = quantity * unit_price
+    return pd.DataFrame({
+        'Date': dates.strftime('%Y-%m-%d'),
+        'Day': dates.day,
+        'Month': np.array(MONTHS)[dates.month - 1],
+        'Year': years,
+        'Customer_Age': ages,
+        'Age_Group': age_groups(ages),
+        'Customer_Gender': rng.choice(['M', 'F'], size=rows),
+        'Country': countries,
+        'State': states,
+        'Product_Category': sold['Product_Category'],
+        'Sub_Category': sold['Sub_Category'],
+        'Product': sold['Product'],
+        'Order_Quantity': quantity,
+        'Unit_Cost': unit_cost,
+        'Unit_Price': unit_price,
+        'Profit': revenue - cost,
+        'Cost': cost,
+        'Revenue': revenue,
+    }, columns=COLUMNS)
+
+
+def write_sales_csv(path, rows, seed=0, chunk_size=1_000_000):
+    rng = np.random.default_rng(seed)
+    catalogue = product_catalogue()
+    writer = None
+    try:
+        for start in range(0, rows, chunk_size):
+            table = pa.Table.from_pandas(sales_chunk(min(chunk_size, rows - start), rng, catalogue), preserve_index=False)
+            if writer is None:
+                writer = pa.csv.CSVWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# Row counts with an optional k/M suffix: 100k, 50M
+def row_count(text):
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1].lower(), 1)
+    return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic sales_data.csv')
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=row_count, default=row_count('100k'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=row_count, default=row_count('1M'))
+    args = parser.parse_args()
+    write_sales_csv(args.path, args.rows, args.seed, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Check the loading of an export whose last line has no newline: one written without a final newline (each
+# append starting with one) must keep its last row, and a row still being written must only be taken in once it
+# is complete. Both load paths are checked, on a fresh load, on a load from the snapshot it wrote and on the
+# updates that follow, against pandas' read of the same rows.
+#
+#   python -m benchmarks.partial_lines [path] [--rows 1000]
+import argparse
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from bikeshop_analytics import DASHBOARD_COLUMNS, SalesDataSource
+from bikeshop_data import DATA_PATH
+
+# Chunk size of the streamed load path, small enough to split the rows into several chunks
+STREAMED_CHUNK_SIZE = 300
+
+
+# The export written in steps, as (bytes appended, rows that must be loaded afterwards). None leaves a step
+# unchecked: a partial row that already has every field can't be told from a complete one
+def scenarios(header, lines):
+    half, last = len(lines) // 2, lines[-1]
+    yield 'unterminated', [(header + b'\n' + b'\n'.join(lines[:half]), half),
+                           (b'\n' + b'\n'.join(lines[half:]), len(lines))]
+    yield 'half-written', [(header + b'\n' + b'\n'.join(lines[:-1]) + b'\n' + last[:len(last) // 2], len(lines) - 1),
+                           (last[len(last) // 2:] + b'\n', len(lines))]
+    yield 'last field cut', [(header + b'\n' + b'\n'.join(lines[:-1]) + b'\n' + last[:-2], None),
+                             (last[-2:] + b'\n', len(lines))]
+
+
+def check(path, rows, directory):
+    with open(path, 'rb') as file:
+        header = file.readline().rstrip(b'\r\n')
+        lines = [file.readline().rstrip(b'\r\n') for _ in range(rows)]
+    revenue = pd.read_csv(io.BytesIO(header + b'\n' + b'\n'.join(lines)))['Revenue'].cumsum()
+
+    for name, steps in scenarios(header, lines):
+        for mode, chunk_size in [('in-memory', 0), ('streamed', STREAMED_CHUNK_SIZE)]:
+            export = os.path.join(directory, f'{name.replace(" ", "_")}_{mode}.csv')
+            sources = []
+            for step, (data, expected_rows) in enumerate(steps):
+                with open(export, 'wb' if step == 0 else 'ab') as file:
+                    file.write(data)
+                if step == 0:
+                    # A fresh load, then a second one from the snapshot the first wrote
+                    sources = [SalesDataSource(export, columns=DASHBOARD_COLUMNS, chunk_size=chunk_size)
+                               for _ in range(2)]
+                for position, source in enumerate(sources):
+                    totals = source.refresh()[1].rollup({}, measures=['Rows', 'Revenue'])
+                    if expected_rows is None:
+                        continue
+                    expected = (expected_rows, revenue.iloc[expected_rows - 1])
+                    assert totals['Rows'] == expected[0] and np.isclose(totals['Revenue'], expected[1]), \
+                        f'{name}, {mode}, source {position}, step {step}: {totals.to_dict()} != {expected}'
+            print(f'ok {name} {mode}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the loading of exports whose last line has no newline')
+    parser.add_argument('path', nargs='?', default=DATA_PATH, help='export the rows are taken from')
+    parser.add_argument('--rows', type=int, default=1000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        check(args.path, args.rows, directory)
+
+
+if __name__ == '__main__':
+    main()
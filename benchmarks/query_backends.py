@@ -0,0 +1,86 @@
+# Compare the query backends against the pandas reference: every section's aggregates for a set of random
+# filter combinations must come out identical, and each backend's build and query times are reported.
+#
+#   python -m benchmarks.query_backends [path] [--selections 50] [--backends duckdb sqlite]
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from bikeshop_analytics import (DASHBOARD_COLUMNS, FILTER_DIMENSIONS, SECTION_AGGREGATES, SalesDataSource,
+                                compute_section_aggregates, make_selection)
+from bikeshop_data import DATA_PATH
+
+
+# Random filter combinations drawn from the values present in the data; each dimension is filtered 40% of the time
+def random_selections(sales_cube, count, seed=0):
+    rng = np.random.default_rng(seed)
+    options = {dimension: sales_cube.options(dimension) for dimension in FILTER_DIMENSIONS}
+    selections = [make_selection()]
+    while len(selections) < count:
+        selections.append({dimension: rng.choice(values) if rng.random() < 0.4 else None
+                           for dimension, values in options.items()})
+    return selections
+
+
+# Same labels, order and values. Integer widths may differ: pandas keeps the narrow dtypes of the compacted frame
+def assert_same(expected, actual, name):
+    if isinstance(expected, dict):
+        assert expected.keys() == actual.keys(), name
+        for key in expected:
+            assert_same(expected[key], actual[key], f'{name}.{key}')
+    elif isinstance(expected, tuple):
+        for position, (expected_part, actual_part) in enumerate(zip(expected, actual)):
+            assert_same(expected_part, actual_part, f'{name}[{position}]')
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(expected, actual, check_dtype=False, check_index_type=False,
+                                       check_categorical=False, check_exact=True, obj=name)
+    elif isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False, check_index_type=False,
+                                      check_column_type=False, check_categorical=False, check_exact=True, obj=name)
+    else:
+        assert (pd.isna(expected) and pd.isna(actual)) or expected == actual, (name, expected, actual)
+
+
+# Seconds spent computing every section for every selection, and the results
+def run_sections(sales_cube, filter_engine, selections):
+    results, started = [], time.perf_counter()
+    for selection in selections:
+        results.append({section: compute_section_aggregates(section, sales_cube, filter_engine, selection)
+                        for section in SECTION_AGGREGATES})
+    return time.perf_counter() - started, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the query backends against the pandas reference')
+    parser.add_argument('path', nargs='?', default=DATA_PATH)
+    parser.add_argument('--selections', type=int, default=50)
+    parser.add_argument('--backends', nargs='+', default=['duckdb', 'sqlite'])
+    args = parser.parse_args()
+
+    timings = []
+    reference = None
+    for backend in ['pandas'] + args.backends:
+        started = time.perf_counter()
+        store_data, sales_cube, filter_engine = SalesDataSource(args.path, DASHBOARD_COLUMNS, backend=backend).refresh()
+        build = time.perf_counter() - started
+        if reference is None:
+            selections = random_selections(sales_cube, args.selections)
+        query, results = run_sections(sales_cube, filter_engine, selections)
+        if reference is None:
+            reference = results
+        else:
+            for selection, expected, actual in zip(selections, reference, results):
+                assert_same(expected, actual, f'{backend} {selection}')
+        timings.append((backend, build, query))
+
+    print(f'{len(store_data):,} rows, {len(selections)} filter combinations x {len(SECTION_AGGREGATES)} sections')
+    print(f'{"backend":<8} {"load+build":>11} {"queries":>9} {"per page":>9}')
+    for backend, build, query in timings:
+        print(f'{backend:<8} {build:>10.2f}s {query:>8.2f}s {query / len(selections) * 1000:>7.1f}ms')
+    print('Results identical to the pandas reference.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# Drive the dashboard's data pipeline without the UI: load an export, then compute every section's aggregates
+# for a matrix of filter combinations and report the load time, latency percentiles and payload size per
+# section, and the peak RSS. Pair it with benchmarks.generate_sales to test at sizes beyond the real data.
+#
+#   python -m benchmarks.generate_sales /tmp/sales_10M.csv --rows 10M
+#   python -m benchmarks.sections /tmp/sales_10M.csv [--per-shape 5] [--repeat 3] [--backend pandas]
+#                                 [--chunk-size 0] [--workers 8] [--json results.json]
+import argparse
+import json
+import pickle
+import resource
+import sys
+import time
+
+import numpy as np
+
+import bikeshop_analytics
+from bikeshop_analytics import (DASHBOARD_COLUMNS, QUERY_BACKEND, SECTION_AGGREGATES, SalesDataSource,
+                                compute_section_aggregates, make_selection)
+from bikeshop_data import CHUNK_SIZE, DATA_PATH, SAMPLE_SIZE
+from bikeshop_geo import build_sales_map_html, compute_geo_summary
+
+# Filter combinations exercised, as the sidebar dimensions each one sets. The sidebar only offers a state
+# within a country, a sub-category within a category and a month within a year
+FILTER_SHAPES = [
+    (),
+    ('Country',),
+    ('Country', 'State'),
+    ('Product_Category',),
+    ('Product_Category', 'Sub_Category'),
+    ('Year',),
+    ('Year', 'Month'),
+    ('Country', 'Product_Category', 'Year'),
+    ('Country', 'State', 'Product_Category', 'Sub_Category', 'Year', 'Month'),
+]
+DEPENDENT_DIMENSIONS = {'State': 'Country', 'Sub_Category': 'Product_Category', 'Month': 'Year'}
+
+PERCENTILES = [50, 90, 99]
+
+
+# Up to per_shape selections of every shape, with values drawn from those the sidebar would offer
+def filter_matrix(sales_cube, per_shape=5, seed=0):
+    rng = np.random.default_rng(seed)
+    selections = []
+    for shape in FILTER_SHAPES:
+        shape_selections = set()
+        for _ in range(per_shape if shape else 1):
+            selection = make_selection()
+            for dimension in shape:
+                parent = DEPENDENT_DIMENSIONS.get(dimension)
+                options = sales_cube.options(dimension, {parent: selection[parent]} if parent else None)
+                selection[dimension] = str(rng.choice(options))
+            shape_selections.add(tuple(selection.items()))
+        selections += [dict(selection) for selection in sorted(shape_selections)]
+    return selections
+
+
+# Peak resident set size of this process so far, in bytes
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# Size of a section's aggregates once serialised: what its charts have to work with, and a proxy for what they
+# send to the browser
+def payload_size(aggregates):
+    return len(pickle.dumps(aggregates, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+# Seconds per call and payload bytes of every section for every selection, each selection computed repeat times.
+# The map ignores the filters, so it is timed once per repeat
+def run_matrix(sales_cube, filter_engine, selections, repeat=1):
+    latencies = {section: [] for section in ['map'] + list(SECTION_AGGREGATES)}
+    payloads = {section: [] for section in latencies}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        map_html = build_sales_map_html(*compute_geo_summary(sales_cube))
+        latencies['map'].append(time.perf_counter() - started)
+        payloads['map'].append(len(map_html.encode()))
+        for selection in selections:
+            for section in SECTION_AGGREGATES:
+                started = time.perf_counter()
+                aggregates = compute_section_aggregates(section, sales_cube, filter_engine, selection)
+                latencies[section].append(time.perf_counter() - started)
+                payloads[section].append(payload_size(aggregates))
+    return latencies, payloads
+
+
+def summarise(latencies, payloads):
+    summary = {}
+    for section, seconds in latencies.items():
+        milliseconds = np.array(seconds) * 1000
+        summary[section] = {
+            'calls': len(milliseconds),
+            **{f'p{percentile}_ms': float(np.percentile(milliseconds, percentile)) for percentile in PERCENTILES},
+            'max_ms': float(milliseconds.max()),
+            'mean_payload_bytes': float(np.mean(payloads[section])),
+            'max_payload_bytes': int(np.max(payloads[section])),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard's data pipeline headlessly")
+    parser.add_argument('path', nargs='?', default=DATA_PATH)
+    parser.add_argument('--per-shape', type=int, default=5, help='selections drawn per filter shape')
+    parser.add_argument('--repeat', type=int, default=3, help='times every selection is computed')
+    parser.add_argument('--backend', default=QUERY_BACKEND)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='stream the export in chunks of this many rows')
+    parser.add_argument('--sample-size', type=int, default=SAMPLE_SIZE)
+    parser.add_argument('--workers', type=int, default=bikeshop_analytics.AGGREGATION_WORKERS,
+                        help='aggregation threads; 1 runs every aggregation serially')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+    bikeshop_analytics.AGGREGATION_WORKERS = args.workers
+
+    started = time.perf_counter()
+    source = SalesDataSource(args.path, DASHBOARD_COLUMNS, args.chunk_size, args.sample_size, backend=args.backend)
+    store_data, sales_cube, filter_engine = source.refresh()
+    load = time.perf_counter() - started
+    load_rss = peak_rss()
+
+    selections = filter_matrix(sales_cube, args.per_shape)
+    latencies, payloads = run_matrix(sales_cube, filter_engine, selections, args.repeat)
+    results = {
+        'path': args.path,
+        'backend': args.backend,
+        'workers': args.workers,
+        'rows': int(store_data.attrs.get('source_rows', len(store_data))),
+        'rows_in_memory': len(store_data),
+        'selections': len(selections),
+        'repeat': args.repeat,
+        'load_seconds': load,
+        'peak_rss_after_load_bytes': load_rss,
+        'peak_rss_bytes': peak_rss(),
+        'sections': summarise(latencies, payloads),
+    }
+
+    print(f'{results["rows"]:,} rows ({results["rows_in_memory"]:,} in memory), backend {args.backend}, '
+          f'{args.workers} workers, {len(selections)} filter combinations x {args.repeat}')
+    print(f'load {load:.2f}s, peak RSS {load_rss / 1024 ** 2:,.0f} MB after load, '
+          f'{results["peak_rss_bytes"] / 1024 ** 2:,.0f} MB overall')
+    print(f'{"section":<17} {"calls":>6} {"p50":>9} {"p90":>9} {"p99":>9} {"max":>9} {"payload":>10}')
+    for section, stats in results['sections'].items():
+        print(f'{section:<17} {stats["calls"]:>6} {stats["p50_ms"]:>7.1f}ms {stats["p90_ms"]:>7.1f}ms '
+              f'{stats["p99_ms"]:>7.1f}ms {stats["max_ms"]:>7.1f}ms {stats["mean_payload_bytes"] / 1024:>8.1f}KB')
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,886 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from bikeshop_data import (CHUNK_SIZE, DATA_PATH, MONTHS, SAMPLE_SIZE, ReservoirSample, append_store_data,
+                           compact_store_data, complete_lines_end, file_fingerprint, file_signature, is_streamed,
+                           line_break_at, read_csv_chunks, read_store_data, sales_files)
+
+# Columns used by the dashboard; the rest of the export is never read
+DASHBOARD_COLUMNS = ['Date', 'Year', 'Month', 'Customer_Age', 'Age_Group', 'Customer_Gender', 'Country', 'State',
+                     'Product_Category', 'Sub_Category', 'Product', 'Order_Quantity', 'Unit_Cost', 'Unit_Price',
+                     'Profit', 'Cost', 'Revenue']
+
+# Dimensions the sidebar can filter on
+FILTER_DIMENSIONS = ['Country', 'State', 'Product_Category', 'Sub_Category', 'Year', 'Month']
+
+# Named groups of dimensions that some sections deliberately leave unfiltered
+FILTER_GROUPS = {
+    'geography': ('Country', 'State'),
+    'product': ('Product_Category', 'Sub_Category'),
+    'time': ('Year', 'Month'),
+}
+
+# Dimensions and measures pre-aggregated into the sales cube; 'Rows' counts the transactions in a cell
+CUBE_DIMENSIONS = ['Country', 'State', 'Product_Category', 'Sub_Category', 'Product', 'Year', 'Month',
+                   'Age_Group', 'Customer_Gender']
+CUBE_MEASURES = ['Revenue', 'Profit', 'Cost', 'Order_Quantity']
+
+# Dimensions and measures of the time rollups: the measures summed per Date and combination of these
+TIME_DIMENSIONS = ['Country', 'State', 'Product_Category', 'Sub_Category']
+TIME_MEASURES = ['Revenue', 'Profit']
+
+# Granularities of the trend charts, as pandas period codes; weeks start on Monday
+TIME_GRANULARITIES = {'Daily': 'D', 'Weekly': 'W', 'Monthly': 'M', 'Yearly': 'Y'}
+
+# Categories counted by the "Number of Products Being Sold" metric
+PRODUCT_CATEGORIES = ['Accessories', 'Bikes', 'Clothing']
+
+# Engine answering the cube rollups: 'pandas' (the reference implementation), 'duckdb' or 'sqlite'.
+# The SQL backends keep the rows in a database file next to the export and, as when streaming, only a bounded
+# sample of them in memory: they trade slower queries than the pandas cube's for a dataset that can outgrow memory
+QUERY_BACKEND = os.environ.get('BIKESHOP_QUERY_BACKEND', 'pandas')
+
+# Directory (ideally on tmpfs, e.g. /dev/shm/bikeshop) through which the server processes of a host share one
+# memory-mapped copy of the dataset; empty loads it in every process (see bikeshop_shared)
+SHARED_DIR = os.environ.get('BIKESHOP_SHARED_DIR', '')
+
+# Number of filter combinations whose page aggregates are kept in memory
+AGGREGATE_CACHE_SIZE = 128
+
+# Number of built charts (Plotly figures and Matplotlib PNGs) kept in memory
+FIGURE_CACHE_SIZE = 256
+
+# Most markers a scatter plot sends to the browser, and how many of them may be individual outliers
+SCATTER_MAX_POINTS = 2000
+SCATTER_MAX_OUTLIERS = 200
+
+# Most outliers drawn per box in a box plot
+BOX_MAX_OUTLIERS = 100
+
+# Threads sharing the large aggregations (see _map_shards); 1 keeps every aggregation serial
+AGGREGATION_WORKERS = int(os.environ.get('BIKESHOP_AGGREGATION_WORKERS', str(os.cpu_count() or 1)))
+
+# Fewest rows worth splitting across the aggregation threads
+PARALLEL_MIN_ROWS = 500_000
+
+# int32 row positions take half the memory of int64 ones; an empty int32 array never widens what it's joined to
+EMPTY_POSITIONS = np.empty(0, dtype=np.int32)
+
+# Rows handed out by the filter engines on this thread (rows of store_data or cells of the cube), for the
+# section render timings. Each script run has its own thread, so sessions don't count each other's rows
+_scanned = threading.local()
+
+
+def scanned_rows():
+    return getattr(_scanned, 'rows', 0)
+
+
+def _count_scanned(rows):
+    _scanned.rows = scanned_rows() + rows
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _parallel(rows):
+    return AGGREGATION_WORKERS > 1 and rows >= PARALLEL_MIN_ROWS
+
+
+# function applied to every shard on a thread pool shared by all sessions, results in shard order. pandas'
+# grouping and sorting kernels and numpy release the GIL, so the threads run in parallel without copying
+# store_data into other processes
+def _map_shards(function, shards):
+    global _executor
+    if AGGREGATION_WORKERS <= 1 or len(shards) < 2:
+        return [function(shard) for shard in shards]
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(AGGREGATION_WORKERS, thread_name_prefix='bikeshop-aggregation')
+    return list(_executor.map(function, shards))
+
+
+# Build the filter selection from the sidebar values; the "All ..." choices mean no filter
+def make_selection(country=None, state=None, product_category=None, sub_category=None, year=None, month=None):
+    selection = {
+        'Country': country,
+        'State': state,
+        'Product_Category': product_category,
+        'Sub_Category': sub_category,
+        'Year': year,
+        'Month': month,
+    }
+    return {dimension: None if value is None or str(value).startswith('All ') else str(value)
+            for dimension, value in selection.items()}
+
+
+# Dimensions named by ignore, which can be a group name, a dimension or a list of either
+def _ignored_dimensions(ignore):
+    if isinstance(ignore, str):
+        ignore = (ignore,)
+    dimensions = set()
+    for name in ignore:
+        dimensions.update(FILTER_GROUPS.get(name, (name,)))
+    return dimensions
+
+
+# Narrowest type for the row positions of a frame of rows: int32, unless it has 2**31 rows or more
+def position_dtype(rows):
+    return np.int32 if rows < 2 ** 31 else np.int64
+
+
+# Keep the elements of the sorted array small that also appear in the sorted array large
+def _intersect_sorted(small, large):
+    if len(small) == 0 or len(large) == 0:
+        return EMPTY_POSITIONS
+    index = np.searchsorted(large, small)
+    index[index == len(large)] = 0
+    return small[large[index] == small]
+
+
+class FilterEngine:
+    # Precompute, for every dimension value, the sorted row positions holding it.
+    # Any filter combination is then an intersection of a few position arrays instead of a scan
+    def __init__(self, frame, dimensions=FILTER_DIMENSIONS, positions=None):
+        self.frame = frame
+        self.positions = positions
+        if positions is not None:
+            return
+        self.positions = {}
+        for dimension in dimensions:
+            values = frame[dimension]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype('category')
+            codes = values.cat.codes.to_numpy()
+            order = np.argsort(codes, kind='stable').astype(position_dtype(len(frame)), copy=False)
+            bounds = np.searchsorted(codes[order], np.arange(len(values.cat.categories) + 1))
+            self.positions[dimension] = {
+                str(category): order[bounds[code]:bounds[code + 1]]
+                for code, category in enumerate(values.cat.categories)
+            }
+
+    # Normalized, hashable form of a selection: the active (dimension, value) pairs
+    def key(self, selection, ignore=()):
+        ignored = _ignored_dimensions(ignore)
+        return tuple((dimension, str(selection[dimension])) for dimension in self.positions
+                     if selection.get(dimension) is not None and dimension not in ignored)
+
+    # Row positions matching the selection, or None when nothing is filtered
+    def row_positions(self, selection, ignore=()):
+        key = self.key(selection, ignore)
+        if not key:
+            return None
+        arrays = sorted((self.positions[dimension].get(value, EMPTY_POSITIONS) for dimension, value in key), key=len)
+        result = arrays[0]
+        for positions in arrays[1:]:
+            result = _intersect_sorted(result, positions)
+        return result
+
+    def query(self, selection, ignore=()):
+        positions = self.row_positions(selection, ignore)
+        frame = self.frame if positions is None else self.frame.take(positions)
+        _count_scanned(len(frame))
+        return frame
+
+    # Row positions matching the selection split by the value of dimension: one sorted array per value that
+    # has rows, in category order
+    def shards(self, selection, dimension, ignore=()):
+        positions = self.row_positions(selection, ignore)
+        shards = []
+        for value_positions in self.positions[dimension].values():
+            if positions is not None:
+                value_positions = _intersect_sorted(*sorted([positions, value_positions], key=len))
+            if len(value_positions):
+                shards.append(value_positions)
+        return shards
+
+    # Values of dimension that still have rows under the selection, in category order
+    def options(self, dimension, selection=None, ignore=()):
+        positions = self.row_positions(selection or {}, ignore)
+        return [value for value, value_positions in self.positions[dimension].items()
+                if len(value_positions) and (positions is None or len(_intersect_sorted(positions, value_positions)))]
+
+    # Engine for frame, whose leading rows are this engine's frame: only the rows after them are indexed
+    def extended(self, frame):
+        offset, dtype = len(self.frame), position_dtype(len(frame))
+        added = FilterEngine(frame.iloc[offset:], list(self.positions))
+        positions = {}
+        for dimension, value_positions in self.positions.items():
+            added_positions = added.positions[dimension]
+            positions[dimension] = {
+                value: np.concatenate([value_positions.get(value, EMPTY_POSITIONS),
+                                       added_positions.get(value, EMPTY_POSITIONS).astype(dtype) + offset], dtype=dtype)
+                for value in added_positions
+            }
+        return FilterEngine(frame, positions=positions)
+
+
+# Cube cells of a frame of sales rows: the measures summed per combination of the cube dimensions, the
+# customers per filter combination and age, and the time measures per day (see TimeRollups). All are indexed
+# by their dimensions
+def cube_cells(store_data):
+    grouped = store_data.groupby(CUBE_DIMENSIONS, observed=True, sort=False)
+    cells = grouped[CUBE_MEASURES].sum()
+    cells['Rows'] = grouped.size()
+    age_cells = store_data.groupby(FILTER_DIMENSIONS + ['Customer_Age'], observed=True, sort=False).size()
+    return cells, age_cells.rename('Rows'), time_cells(store_data)
+
+
+# The time measures per Date and combination of the time dimensions
+def time_cells(store_data):
+    return store_data.groupby(['Date'] + TIME_DIMENSIONS, observed=True, sort=False)[TIME_MEASURES].sum()
+
+
+# cube_cells of one shard of store_data, with the position in store_data of each cell's first row
+def _shard_cube_cells(store_data, positions):
+    shard = store_data.take(positions)
+    grouped = shard.groupby(CUBE_DIMENSIONS, observed=True, sort=False)
+    cells = grouped[CUBE_MEASURES].sum()
+    cells['Rows'] = grouped.size()
+    age_grouped = shard.groupby(FILTER_DIMENSIONS + ['Customer_Age'], observed=True, sort=False)
+    age_cells = age_grouped.size().rename('Rows')
+    time_grouped = shard.groupby(['Date'] + TIME_DIMENSIONS, observed=True, sort=False)
+    return ((cells, positions[grouped.cumcount().to_numpy() == 0]),
+            (age_cells, positions[age_grouped.cumcount().to_numpy() == 0]),
+            (time_grouped[TIME_MEASURES].sum(), positions[time_grouped.cumcount().to_numpy() == 0]))
+
+
+# cube_cells of a large store_data computed per State on the aggregation threads. All of a cell's rows share
+# one State, so each cell is summed over the same rows in the same order as in the serial groupby, and the
+# cells are put back in order of first appearance, as groupby(sort=False) returns them: the result is identical
+def sharded_cube_cells(store_data, filter_engine):
+    shards = filter_engine.shards({}, 'State')
+    if not _parallel(len(store_data)) or len(shards) < 2:
+        return cube_cells(store_data)
+    merged = []
+    for parts in zip(*_map_shards(lambda positions: _shard_cube_cells(store_data, positions), shards)):
+        order = np.argsort(np.concatenate([first for _, first in parts]), kind='stable')
+        merged.append(pd.concat([cells for cells, _ in parts]).iloc[order])
+    return tuple(merged)
+
+
+# Fold the cells of several row sets (e.g. chunks of one export) into the cells of all their rows
+def merge_cube_cells(*parts):
+    merged = []
+    for frames in zip(*parts):
+        combined = pd.concat(frames)
+        merged.append(combined.groupby(level=list(range(combined.index.nlevels)), observed=True, sort=False).sum())
+    return tuple(merged)
+
+
+class CellAccumulator:
+    # Cells of a stream of chunks, held as a few partial merges. Like the digits of a binary counter, two
+    # partials of the same level merge into one of the next level, so each cell is regrouped about
+    # log2(chunks) times in all rather than once per later chunk. merge_cube_cells(*parts()) gives the cells of
+    # every chunk added
+    def __init__(self):
+        self.levels = []
+
+    def add(self, cells):
+        level = 0
+        while self.levels and self.levels[-1][0] == level:
+            cells = merge_cube_cells(self.levels.pop()[1], cells)
+            level += 1
+        self.levels.append((level, cells))
+
+    def parts(self):
+        return [cells for _, cells in self.levels]
+
+
+# Merged cells with their dimensions turned back into categoricals, as in the in-memory path
+def categorical_cells(cells):
+    return tuple(compact_store_data(frame.reset_index()).set_index(list(frame.index.names)) for frame in cells)
+
+
+# First day of the period holding each date, for a TIME_GRANULARITIES code
+def period_starts(dates, frequency):
+    if frequency == 'D':
+        return dates
+    if frequency == 'W':
+        return dates - pd.to_timedelta(dates.dt.dayofweek, unit='D')
+    return dates.dt.to_period(frequency).dt.start_time
+
+
+class TimeRollups:
+    # Revenue and Profit per day, month and year for every combination of the time dimensions. The daily cells
+    # are summed from the rows along with the cube (or passed in, as cells or their engine), the monthly and
+    # yearly ones from the daily cells, so a trend at any granularity and over any date range reads cells,
+    # never rows
+    def __init__(self, rows=None, cells=None, engine=None):
+        if engine is None:
+            engine = FilterEngine((time_cells(rows) if cells is None else cells).reset_index(), TIME_DIMENSIONS)
+        self.engines = {'D': engine}
+        daily = engine.frame
+        for frequency in ['M', 'Y']:
+            grouped = daily.groupby([period_starts(daily['Date'], frequency)] + TIME_DIMENSIONS, observed=True, sort=False)
+            self.engines[frequency] = FilterEngine(grouped[TIME_MEASURES].sum().reset_index(), TIME_DIMENSIONS)
+        self.start, self.end = daily['Date'].min(), daily['Date'].max()
+
+    # Totals of the selection per period of the granularity between start and end (inclusive, default: every
+    # date), indexed by each period's first day. Months and years come from their own cells when the range
+    # covers whole ones, and are summed from the daily cells otherwise
+    def series(self, selection, granularity='Monthly', start=None, end=None, ignore=()):
+        frequency = TIME_GRANULARITIES[granularity]
+        start = self.start if start is None else max(pd.Timestamp(start), self.start)
+        end = self.end if end is None else min(pd.Timestamp(end), self.end)
+        table = frequency if frequency in self.engines and self._whole_periods(frequency, start, end) else 'D'
+        cells = self.engines[table].query(selection, ignore)
+        first = start if table == 'D' else start.to_period(frequency).start_time
+        totals = cells[(cells['Date'] >= first) & (cells['Date'] <= end)].groupby('Date')[TIME_MEASURES].sum()
+        if frequency in ('D', table):
+            return totals
+        # Fold the days into weeks, months or years
+        return totals.groupby(period_starts(totals.index.to_series(), frequency)).sum()
+
+    # Whether start and end cut no period of the frequency short of its rows
+    def _whole_periods(self, frequency, start, end):
+        return ((start == self.start or start == start.to_period(frequency).start_time) and
+                (end == self.end or end == end.to_period(frequency).end_time.normalize()))
+
+    # The daily cells indexed by their dimensions, as time_cells returns them
+    def daily_cells(self):
+        return self.engines['D'].frame.set_index(['Date'] + TIME_DIMENSIONS)
+
+
+class SalesCube:
+    # Sum every measure over each observed combination of the cube dimensions once, at load time.
+    # Charts then roll up cube cells, so their cost follows the cube size rather than the row count.
+    # Cells folded elsewhere (see SalesDataSource) can be passed instead of the rows, or the engines of cells
+    # already laid out (see bikeshop_shared)
+    def __init__(self, store_data=None, cells=None, engines=None):
+        if engines is None:
+            cells, age_cells, daily_cells = cube_cells(store_data) if cells is None else cells
+            engines = (FilterEngine(cells.reset_index()), FilterEngine(age_cells.reset_index()),
+                       FilterEngine(daily_cells.reset_index(), TIME_DIMENSIONS))
+        self.engine, self.age_engine, time_engine = engines
+        self.cells = self.engine.frame
+
+        # Category of every product, for chart labels
+        self.product_categories = self.cells.drop_duplicates('Product').set_index('Product')['Product_Category']
+
+        # Unfiltered profit per country, ranked once per dataset for the business metrics
+        self.country_profit = self.cells.groupby('Country', observed=True)['Profit'].sum()
+
+        # Customers per age under each filter combination, for the age density and its median/mean
+        self.age_cells = self.age_engine.frame
+
+        # Revenue and Profit per day, month and year, for the trend charts
+        self.time_rollups = TimeRollups(engine=time_engine)
+
+    # Totals of measures (a name or a list) for the selection, grouped by the by dimension(s) if given
+    def rollup(self, selection, by=None, measures=CUBE_MEASURES + ['Rows'], ignore=()):
+        cells = self.engine.query(selection, ignore)
+        if by is None:
+            return cells[measures].sum()
+        return cells.groupby(by, observed=True)[measures].sum()
+
+    # Number of customers at each distinct age for the selection, indexed by age
+    def age_counts(self, selection, ignore=()):
+        cells = self.age_engine.query(selection, ignore)
+        return cells.groupby('Customer_Age')['Rows'].sum()
+
+    # Values of dimension that still have sales under the selection, in category order
+    def options(self, dimension, selection=None, ignore=()):
+        return self.engine.options(dimension, selection, ignore)
+
+    # Cube of the rows counted so far plus the frames in chunks, merged cell by cell without revisiting the old
+    # rows. The chunks' cells are merged among themselves first, so the cube's own cells are regrouped once
+    def extended(self, chunks):
+        accumulator = CellAccumulator()
+        for chunk in chunks:
+            accumulator.add(cube_cells(chunk))
+        cells = (self.cells.set_index(CUBE_DIMENSIONS), self.age_cells.set_index(FILTER_DIMENSIONS + ['Customer_Age']),
+                 self.time_rollups.daily_cells())
+        return SalesCube(cells=categorical_cells(merge_cube_cells(cells, *accumulator.parts())))
+
+
+# Mean and median of the values behind a count vector (index = value, data = count)
+def weighted_mean(counts):
+    return float(np.dot(counts.index.to_numpy(dtype=float), counts.to_numpy(dtype=float)) / counts.sum())
+
+
+def weighted_median(counts):
+    values = counts.index.to_numpy(dtype=float)
+    cumulative = np.cumsum(counts.to_numpy())
+    total = cumulative[-1]
+    lower = values[np.searchsorted(cumulative, (total - 1) // 2, side='right')]
+    upper = values[np.searchsorted(cumulative, total // 2, side='right')]
+    return (lower + upper) / 2
+
+
+# Gaussian kernel density from a count vector. Same bandwidth rule (Scott) and cut as seaborn's kdeplot,
+# but the cost grows with the number of distinct values times the grid size instead of the number of rows
+def binned_density(counts, grid_size=200, cut=3):
+    values = counts.index.to_numpy(dtype=float)
+    weights = counts.to_numpy(dtype=float)
+    total = weights.sum()
+    mean = np.dot(values, weights) / total
+    variance = np.dot((values - mean) ** 2, weights) / max(total - 1, 1)
+    bandwidth = np.sqrt(variance) * total ** (-1 / 5) if variance > 0 else 1.0
+
+    grid = np.linspace(values.min() - cut * bandwidth, values.max() + cut * bandwidth, grid_size)
+    kernel = np.exp(-0.5 * ((grid[:, None] - values[None, :]) / bandwidth) ** 2)
+    density = kernel @ weights / (total * bandwidth * np.sqrt(2 * np.pi))
+    return grid, density
+
+
+class AggregateCache:
+    # Bounded least-recently-used cache of computed aggregates, safe to share between sessions
+    def __init__(self, max_entries=AGGREGATE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        # Compute outside the lock so one slow filter combination doesn't block the other sessions
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries),
+                    'max_entries': self.max_entries}
+
+
+# The k largest values of a series (smallest with ascending), in rank order. Partial selection keeps this
+# linear in the series length; only the k selected values are sorted. k=None ranks the whole series
+def top_k(values, k=None, ascending=False):
+    keys = values.to_numpy() if ascending else -values.to_numpy()
+    if k is not None and k < len(keys):
+        # Values tied with the k-th keep their original order, as in a stable sort of the whole series
+        kth = np.partition(keys, k - 1)[k - 1]
+        selected = np.flatnonzero(keys < kth)
+        selected = np.concatenate([selected, np.flatnonzero(keys == kth)[:k - len(selected)]])
+        order = selected[np.argsort(keys[selected], kind='stable')]
+    else:
+        order = np.argsort(keys, kind='stable')
+    return values.iloc[order]
+
+
+# Best and worst k of one grouped result
+def top_bottom_k(values, k):
+    return top_k(values, k), top_k(values, k, ascending=True)
+
+
+# Rows outside the 1.5 IQR whiskers, and how far outside them in IQRs
+def _outlier_scores(values):
+    q1, q3 = np.percentile(values, [25, 75])
+    spread = q3 - q1 if q3 > q1 else 1.0
+    return np.maximum(q1 - 1.5 * spread - values, values - q3 - 1.5 * spread) / spread
+
+
+# Reduce a scatter to at most max_points markers with a 'Count' of the transactions behind each.
+# Distinct (color, x, y) points are used as they are when there are few enough of them; otherwise the
+# outliers stay individual points and the rest collapse into 2-D tiles placed at their mean position
+def reduce_scatter(frame, x, y, color, max_points=SCATTER_MAX_POINTS, max_outliers=SCATTER_MAX_OUTLIERS, bins=64,
+                   points=None):
+    if points is None:
+        points = _scatter_points(frame, x, y, color)
+    points = points.reset_index()
+    if len(points) <= max_points:
+        return points
+
+    x_values = frame[x].to_numpy(dtype=float)
+    y_values = frame[y].to_numpy(dtype=float)
+    scores = np.maximum(_outlier_scores(x_values), _outlier_scores(y_values))
+    outlier_positions = np.flatnonzero(scores > 0)
+    if len(outlier_positions) > max_outliers:
+        # Keep the most extreme ones
+        outlier_positions = outlier_positions[np.argsort(-scores[outlier_positions], kind='stable')[:max_outliers]]
+    outliers = frame[[color, x, y]].iloc[np.sort(outlier_positions)].assign(Count=1)
+
+    inliers = np.ones(len(frame), dtype=bool)
+    inliers[outlier_positions] = False
+    x_inliers, y_inliers = x_values[inliers], y_values[inliers]
+    tile_columns = {color: frame[color].to_numpy()[inliers], x: x_inliers, y: y_inliers}
+
+    # Halve the resolution until the tiles fit in what the outliers left of the budget
+    budget = max(max_points - len(outliers), 1)
+    while True:
+        tile_columns['x_bin'] = _bin_index(x_inliers, bins)
+        tile_columns['y_bin'] = _bin_index(y_inliers, bins)
+        tiles = pd.DataFrame(tile_columns).groupby([color, 'x_bin', 'y_bin'], observed=True, sort=False).agg(
+            **{x: (x, 'mean'), y: (y, 'mean'), 'Count': (x, 'size')})
+        if len(tiles) <= budget or bins == 1:
+            break
+        bins //= 2
+    tiles = tiles.reset_index()[[color, x, y, 'Count']].sort_values(color, kind='stable')
+    return pd.concat([tiles, outliers], ignore_index=True)
+
+
+def _scatter_points(frame, x, y, color):
+    return frame.groupby([color, x, y], observed=True).size().rename('Count')
+
+
+# reduce_scatter of frame, the selected rows. On large selections the distinct points are counted per color on
+# the aggregation threads; each color's points only depend on its own rows, and sorted groups come out in color order
+def sharded_reduce_scatter(filter_engine, selection, frame, x, y, color):
+    points = None
+    shards = filter_engine.shards(selection, color) if _parallel(len(frame)) else []
+    if len(shards) > 1:
+        points = pd.concat(_map_shards(lambda positions: _scatter_points(filter_engine.frame.take(positions), x, y, color),
+                                       shards))
+    return reduce_scatter(frame, x, y, color, points=points)
+
+
+def _bin_index(values, bins):
+    if not len(values):
+        return values.astype(np.int64)
+    low, high = values.min(), values.max()
+    if high == low:
+        return np.zeros(len(values), dtype=np.int64)
+    return np.minimum(((values - low) / (high - low) * bins).astype(np.int64), bins - 1)
+
+
+# Box-plot statistics per group, computed like Plotly's own box traces: linear quartiles, whiskers at the
+# furthest values within 1.5 IQR, and the values beyond them as outliers (the most extreme max_outliers per group).
+# Without 'by' the whole column is one group labelled with the column name
+def box_statistics(frame, value, by=None, max_outliers=BOX_MAX_OUTLIERS):
+    values = frame[value]
+    keys = frame[by] if by is not None else pd.Series(value, index=frame.index)
+    grouped = values.groupby(keys, observed=True)
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack().reindex(columns=[0.25, 0.5, 0.75])
+    stats.columns = ['q1', 'median', 'q3']
+
+    # Per-row whisker limits of the row's group
+    row_stats = stats.reindex(keys.to_numpy())
+    q1, q3 = row_stats['q1'].to_numpy(), row_stats['q3'].to_numpy()
+    spread = 1.5 * (q3 - q1)
+    row_values = values.to_numpy(dtype=float)
+    outside = np.maximum(q1 - spread - row_values, row_values - q3 - spread)
+    inside = outside <= 0
+
+    stats['lowerfence'] = values[inside].groupby(keys[inside], observed=True).min()
+    stats['upperfence'] = values[inside].groupby(keys[inside], observed=True).max()
+    stats['count'] = grouped.size()
+
+    outliers = pd.DataFrame({'group': keys[~inside], value: values[~inside], 'outside': outside[~inside]})
+    outliers = outliers.sort_values('outside', ascending=False, kind='stable')
+    outliers = outliers[outliers.groupby('group', observed=True).cumcount() < max_outliers]
+    return stats, outliers[['group', value]].sort_index()
+
+
+# box_statistics of the selected rows grouped by a filter dimension. On large selections every group is
+# computed on its own on the aggregation threads; a group's statistics and outliers only depend on its rows,
+# so concatenating the groups in category order gives the serial result exactly
+def sharded_box_statistics(filter_engine, selection, value, by, ignore=(), max_outliers=BOX_MAX_OUTLIERS):
+    shards = filter_engine.shards(selection, by, ignore)
+    rows = sum(len(positions) for positions in shards)
+    if not _parallel(rows) or len(shards) < 2:
+        return box_statistics(filter_engine.query(selection, ignore), value, by, max_outliers)
+    _count_scanned(rows)
+    parts = _map_shards(lambda positions: box_statistics(filter_engine.frame.take(positions), value, by, max_outliers),
+                        shards)
+    return pd.concat([stats for stats, _ in parts]), pd.concat([outliers for _, outliers in parts]).sort_index()
+
+
+# All business metrics from one grouped rollup of the cube and the customer age counts
+def compute_business_metrics(sales_cube, selection):
+    product_totals = sales_cube.rollup(selection, ['Product_Category', 'Sub_Category', 'Product'],
+                                       ['Revenue', 'Profit', 'Cost', 'Order_Quantity'])
+    totals = product_totals.sum()
+    subcategory_profit = product_totals['Profit'].groupby(level='Sub_Category', observed=True).sum()
+    products = product_totals.index.droplevel('Sub_Category').unique()
+    customer_age_counts = sales_cube.age_counts(selection)
+    return {
+        'total_profit': totals['Profit'],
+        'total_revenues': totals['Revenue'],
+        'total_expenses': totals['Cost'],
+        'total_order_quantity': totals['Order_Quantity'],
+        'most_profitable_country': sales_cube.country_profit.idxmax(),
+        'least_profitable_country': sales_cube.country_profit.idxmin(),
+        'most_profitable_subcategory': subcategory_profit.idxmax() if len(subcategory_profit) else None,
+        'least_profitable_subcategory': subcategory_profit.idxmin() if len(subcategory_profit) else None,
+        'average_age': weighted_median(customer_age_counts) if len(customer_age_counts) else np.nan,
+        'num_products_sold': int(products.get_level_values('Product_Category').isin(PRODUCT_CATEGORIES).sum()),
+    }
+
+
+# Aggregates needed by each dashboard section, so a section only computes what it shows
+def _demographics_aggregates(sales_cube, filter_engine, selection):
+    customer_age_counts = sales_cube.age_counts(selection)
+    return {
+        'customers_per_age_group': sales_cube.rollup(selection, 'Age_Group', 'Rows'),
+        'customers_per_gender': sales_cube.rollup(selection, 'Customer_Gender', 'Rows'),
+        'customers_per_country': sales_cube.rollup(selection, 'Country', 'Rows'),
+        'customers_per_state': sales_cube.rollup(selection, 'State', 'Rows'),
+        'customer_age_counts': customer_age_counts,
+        'age_per_country_box': sharded_box_statistics(filter_engine, selection, 'Customer_Age', 'Country'),
+        'mean_customer_age': weighted_mean(customer_age_counts) if len(customer_age_counts) else np.nan,
+        'median_customer_age': weighted_median(customer_age_counts) if len(customer_age_counts) else np.nan,
+    }
+
+
+def _orders_aggregates(sales_cube, filter_engine, selection):
+    order_totals = sales_cube.rollup(selection, measures=['Order_Quantity', 'Rows'])
+    return {
+        'customers_per_category': sales_cube.rollup(selection, 'Product_Category', 'Rows'),
+        'orders_per_subcategory': sales_cube.rollup(selection, 'Sub_Category', 'Order_Quantity'),
+        'mean_order_quantity': order_totals['Order_Quantity'] / order_totals['Rows'] if order_totals['Rows'] else np.nan,
+        'order_quantity_box': box_statistics(filter_engine.query(selection), 'Order_Quantity'),
+    }
+
+
+def _revenue_profit_aggregates(sales_cube, filter_engine, selection):
+    return {
+        'revenue_per_category': sales_cube.rollup(selection, 'Product_Category', 'Revenue'),
+        'revenue_per_age_group': sales_cube.rollup(selection, 'Age_Group', 'Revenue'),
+        'revenue_per_country': sales_cube.rollup(selection, 'Country', 'Revenue', ignore='geography'),
+        'profit_per_country': sales_cube.rollup(selection, 'Country', 'Profit', ignore='geography'),
+        'profit_per_country_box': sharded_box_statistics(filter_engine, selection, 'Profit', 'Country', ignore='geography'),
+    }
+
+
+# Only the ranked ends are kept, not the full per-product series
+def _top_charts_aggregates(sales_cube, filter_engine, selection):
+    best_products, worst_products = top_bottom_k(sales_cube.rollup(selection, 'Product', 'Revenue'), 10)
+    return {
+        'top_products_by_orders': top_k(sales_cube.rollup(selection, 'Product', 'Order_Quantity'), 10),
+        'top_products_by_revenue': best_products,
+        'worst_products_by_revenue': worst_products,
+        'top_states_by_revenue': top_k(sales_cube.rollup(selection, 'State', 'Revenue', ignore='State'), 20),
+    }
+
+
+# Read from the time rollups, labelled by Year and Month as the cube would label them
+def _sales_trend_aggregates(sales_cube, filter_engine, selection):
+    per_year = sales_cube.time_rollups.series(selection, 'Yearly', ignore='time')['Revenue']
+    per_month = sales_cube.time_rollups.series(selection, 'Monthly', ignore='time')['Revenue']
+    year_dtype = filter_engine.frame['Year'].cat.categories.dtype
+    return {
+        'revenue_per_year': per_year.set_axis(pd.Index(per_year.index.year.astype(year_dtype), name='Year')),
+        'revenue_per_month': per_month.set_axis(pd.MultiIndex.from_arrays(
+            [per_month.index.year.astype(year_dtype),
+             pd.Categorical(per_month.index.month_name(), categories=MONTHS, ordered=True)], names=['Year', 'Month'])),
+    }
+
+
+def _correlation_aggregates(sales_cube, filter_engine, selection):
+    filtered_data = filter_engine.query(selection)
+    return {
+        'cost_price_points': sharded_reduce_scatter(filter_engine, selection, filtered_data, 'Unit_Cost', 'Unit_Price',
+                                                    'Product_Category'),
+        'quantity_profit_points': sharded_reduce_scatter(filter_engine, selection, filtered_data, 'Order_Quantity',
+                                                         'Profit', 'Product_Category'),
+    }
+
+
+SECTION_AGGREGATES = {
+    'business_metrics': lambda sales_cube, filter_engine, selection: {
+        'business_metrics': compute_business_metrics(sales_cube, selection)},
+    'demographics': _demographics_aggregates,
+    'orders': _orders_aggregates,
+    'revenue_profit': _revenue_profit_aggregates,
+    'top_charts': _top_charts_aggregates,
+    'sales_trend': _sales_trend_aggregates,
+    'correlation': _correlation_aggregates,
+}
+
+
+def compute_section_aggregates(section, sales_cube, filter_engine, selection):
+    return SECTION_AGGREGATES[section](sales_cube, filter_engine, selection)
+
+
+class SalesDataSource:
+    # The live dataset of one export as (store_data, sales_cube, filter_engine). refresh() loads it the first
+    # time; afterwards rows appended to a file and files new to a directory are folded into the current version
+    # instead of rebuilding it, and the new version replaces the old one in a single assignment, so a script run
+    # that already holds a version keeps a consistent one. A rewritten file only contributes the rows dated after
+    # the current latest Date; a file that shrank or disappeared triggers a full reload.
+    # Streamed exports (see is_streamed) keep only a uniform sample of the rows, as store_data.
+    # backend picks the cube implementation, see QUERY_BACKEND; the SQL backends always stream
+    def __init__(self, path=DATA_PATH, columns=None, chunk_size=CHUNK_SIZE, sample_size=SAMPLE_SIZE,
+                 backend=QUERY_BACKEND):
+        self.path = path
+        self.columns = None if columns is None else list(columns)
+        self.chunk_size = chunk_size
+        self.sample_size = sample_size
+        self.backend = backend
+        self.streamed = is_streamed(path, chunk_size) or backend != 'pandas'
+        self.dataset = None
+        # file -> (mtime, size, offset read up to, fingerprint at that offset)
+        self.files = {}
+        self.max_date = None
+        self.sample = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        signature = file_signature(self.path)
+        dataset = self.dataset
+        if dataset is not None and dataset[0].attrs['version'] == f'{signature[0]}:{signature[1]}':
+            return dataset
+        # While one session folds in new data the others keep using the current version instead of waiting
+        if not self._lock.acquire(blocking=dataset is None):
+            return dataset
+        try:
+            if self.dataset is dataset:
+                self.dataset = self._load(signature) if dataset is None else self._update(signature)
+            return self.dataset
+        finally:
+            self._lock.release()
+
+    def _file_stats(self):
+        return {file: (stat.st_mtime_ns, stat.st_size) for file in sales_files(self.path) for stat in [os.stat(file)]}
+
+    # Columns read from the CSV: the requested ones plus Date, which tracks the latest date seen
+    def _read_columns(self):
+        return None if self.columns is None else list(dict.fromkeys(self.columns + ['Date']))
+
+    # Note the latest Date of a chunk and drop the column unless it was requested
+    def _without_date(self, chunk):
+        chunk_max = chunk['Date'].max()
+        if pd.notna(chunk_max) and (self.max_date is None or chunk_max > self.max_date):
+            self.max_date = chunk_max
+        return chunk if self.columns is None else chunk[self.columns]
+
+    def _load(self, signature):
+        stats = self._file_stats()
+        # As in _update, a line still being written is left for the next update
+        ends = {file: complete_lines_end(file, 0, size) for file, (mtime, size) in stats.items()}
+        if self.streamed:
+            self.sample = ReservoirSample(self.sample_size)
+            self.max_date = None
+            chunks = self._sampled_chunks(ends)
+            if self.backend == 'pandas':
+                accumulator = CellAccumulator()
+                for chunk in chunks:
+                    accumulator.add(cube_cells(chunk))
+                sales_cube = SalesCube(cells=categorical_cells(merge_cube_cells(*accumulator.parts())))
+            else:
+                sales_cube = self._new_cube(chunks)
+            store_data = self._sample_frame()
+            filter_engine = FilterEngine(store_data)
+        else:
+            store_data = read_store_data(self.path, signature, self.columns, ends[self.path])
+            self.max_date = store_data.attrs['max_date']
+            filter_engine = FilterEngine(store_data)
+            sales_cube = self._new_cube(store_data, filter_engine)
+        self.files = {file: (mtime, size, ends[file], file_fingerprint(file, ends[file]))
+                      for file, (mtime, size) in stats.items()}
+        return self._stamp(store_data, signature), sales_cube, filter_engine
+
+    # Every chunk of a streamed export, added to the sample as it is read
+    def _sampled_chunks(self, ends):
+        for file, end in ends.items():
+            for chunk in read_csv_chunks(file, self._read_columns(), self.chunk_size, end=end):
+                chunk = self._without_date(chunk)
+                self.sample.add(chunk)
+                yield chunk
+
+    # Fold what changed since the last load into a new version
+    def _update(self, signature):
+        stats = self._file_stats()
+        if set(self.files) - set(stats):
+            return self._load(signature)
+
+        new_rows = []
+        files = dict(self.files)
+        for file, (mtime, size) in stats.items():
+            known = files.get(file)
+            if known is not None and known[:2] == (mtime, size):
+                continue
+            if known is None:
+                start, date_after = 0, None
+            elif size < known[2] or self.max_date is None:
+                return self._load(signature)
+            elif file_fingerprint(file, known[2]) != known[3]:
+                # Rewritten: keep the rows newer than everything loaded so far
+                start, date_after = 0, self.max_date
+            elif known[3].endswith(b'\n') or line_break_at(file, known[2]):
+                # Appended to: read from where the last read stopped
+                start, date_after = known[2], None
+            else:
+                # The unterminated last row taken by the last read was still being written: read everything again
+                return self._load(signature)
+            end = complete_lines_end(file, start, size)
+            for chunk in read_csv_chunks(file, self._read_columns(), self.chunk_size, start, end):
+                if date_after is not None:
+                    chunk = chunk[chunk['Date'] > date_after]
+                new_rows.append(self._without_date(chunk))
+            files[file] = (mtime, size, end, file_fingerprint(file, end))
+
+        store_data, sales_cube, filter_engine = self.dataset
+        new_rows = [chunk for chunk in new_rows if len(chunk)]
+        if self.streamed:
+            if new_rows:
+                sales_cube = sales_cube.extended(new_rows)
+                for chunk in new_rows:
+                    self.sample.add(chunk)
+                store_data = self._sample_frame()
+                filter_engine = FilterEngine(store_data)
+        elif new_rows:
+            added = compact_store_data(pd.concat(new_rows, ignore_index=True))
+            memory_usage = store_data.attrs['memory_usage']
+            memory_before = memory_usage['before'] + int(added.memory_usage(deep=True).sum())
+            sales_cube = sales_cube.extended([added])
+            store_data = append_store_data(store_data, added)
+            filter_engine = filter_engine.extended(store_data)
+            store_data.attrs['memory_usage'] = {'before': memory_before,
+                                                'after': int(store_data.memory_usage(deep=True).sum())}
+        self.files = files
+        # A shallow copy, so runs still holding the previous version keep its attrs
+        return self._stamp(store_data.copy(deep=False), signature), sales_cube, filter_engine
+
+    # With filter_engine (the engine of rows), the pandas cube is summed per State on the aggregation threads.
+    # The SQL cubes take the chunks of the streamed export, insert them one at a time into a database file
+    def _new_cube(self, rows, filter_engine=None):
+        if self.backend == 'pandas':
+            return SalesCube(cells=sharded_cube_cells(rows, filter_engine)) if filter_engine is not None else SalesCube(rows)
+        # Imported here: the SQL backends are optional and build on this module
+        from bikeshop_sql import SQLSalesCube, database_prefix
+        return SQLSalesCube(backend=self.backend, chunks=rows, prefix=database_prefix(self.path))
+
+    def _sample_frame(self):
+        sample_rows = self.sample.frame()
+        store_data = compact_store_data(sample_rows)
+        store_data.attrs['memory_usage'] = {'before': int(sample_rows.memory_usage(deep=True).sum()),
+                                            'after': int(store_data.memory_usage(deep=True).sum())}
+        store_data.attrs['source_rows'] = self.sample.seen
+        return store_data
+
+    def _stamp(self, store_data, signature):
+        store_data.attrs['version'] = f'{signature[0]}:{signature[1]}'
+        store_data.attrs['max_date'] = self.max_date
+        return store_data
+
+
+# One live dataset per export, shared by every session, and with SHARED_DIR by every process of the host
+@st.cache_resource
+def get_sales_source(path=DATA_PATH, columns=None, backend=QUERY_BACKEND, shared_dir=SHARED_DIR):
+    if shared_dir:
+        # Imported here, like the SQL backends: the shared mode builds on this module
+        from bikeshop_shared import SharedSalesSource
+        return SharedSalesSource(path, columns, shared_dir)
+    return SalesDataSource(path, columns, backend=backend)
+
+
+# A single process-wide cache, so one session's computation serves everyone
+@st.cache_resource
+def get_aggregate_cache():
+    return AggregateCache()
+
+
+# Built charts get their own cache, so the many small chart entries never push the section aggregates out
+@st.cache_resource
+def get_figure_cache():
+    return AggregateCache(FIGURE_CACHE_SIZE)
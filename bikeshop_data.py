@@ -0,0 +1,305 @@
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Location of the sales export, relative to the directory the app is started from.
+# It can also be a directory of CSV drops (e.g. one file per day), which is always streamed
+DATA_PATH = os.environ.get('BIKESHOP_DATA_PATH', 'sales_data.csv')
+
+# Rows read at a time when streaming the export; 0 loads a single file in one go
+CHUNK_SIZE = int(os.environ.get('BIKESHOP_CHUNK_SIZE', '0'))
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Raw rows kept, as a uniform sample, for the row-level charts when the export is streamed
+SAMPLE_SIZE = int(os.environ.get('BIKESHOP_SAMPLE_SIZE', '200000'))
+
+MONTHS = ["January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December"]
+
+# Explicit column types for sales_data.csv so pandas never has to guess them ('Date' is parsed separately)
+SALES_SCHEMA = {
+    'Day': 'int64',
+    'Month': 'str',
+    'Year': 'int64',
+    'Customer_Age': 'int64',
+    'Age_Group': 'str',
+    'Customer_Gender': 'str',
+    'Country': 'str',
+    'State': 'str',
+    'Product_Category': 'str',
+    'Sub_Category': 'str',
+    'Product': 'str',
+    'Order_Quantity': 'int64',
+    'Unit_Cost': 'float64',
+    'Unit_Price': 'float64',
+    'Profit': 'float64',
+    'Cost': 'float64',
+    'Revenue': 'float64',
+}
+
+# Text dimensions stored dictionary-encoded in the columnar snapshot
+DICTIONARY_COLUMNS = ['Country', 'State', 'Product_Category', 'Sub_Category', 'Product', 'Age_Group', 'Customer_Gender']
+
+# Low-cardinality dimensions kept as categoricals in memory (Month gets its calendar order separately)
+CATEGORICAL_COLUMNS = DICTIONARY_COLUMNS + ['Year']
+
+# Schema metadata key recording which CSV version a snapshot was converted from
+SNAPSHOT_SOURCE_KEY = b'bikeshop_source'
+
+# Bytes at the end of what was read from a file that must be unchanged for the file to count as appended to
+FINGERPRINT_SIZE = 4096
+
+
+# The CSV files making up the export: the file itself, or the .csv files of a directory in name order
+def sales_files(path=DATA_PATH):
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.csv')]
+    return [path]
+
+
+# (mtime, size) of the data file, used as the cache key and as the dataset version.
+# For a directory: the newest mtime and the total size of its CSV files
+def file_signature(path=DATA_PATH):
+    stats = [os.stat(file) for file in sales_files(path)]
+    return max((stat.st_mtime_ns for stat in stats), default=0), sum(stat.st_size for stat in stats)
+
+
+def is_streamed(path=DATA_PATH, chunk_size=CHUNK_SIZE):
+    return os.path.isdir(path) or chunk_size > 0
+
+
+# The Arrow IPC snapshot lives next to the CSV: sales_data.csv -> sales_data.arrow
+def snapshot_path(path=DATA_PATH):
+    return os.path.splitext(path)[0] + '.arrow'
+
+
+# The whole export, or only its first end bytes (e.g. up to the last complete line)
+def read_sales_csv(path=DATA_PATH, columns=None, end=None):
+    usecols = None if columns is None else list(columns)
+    parse_dates = ['Date'] if usecols is None or 'Date' in usecols else False
+    if end is None:
+        return pd.read_csv(path, dtype=SALES_SCHEMA, usecols=usecols, parse_dates=parse_dates)
+    with open(path, 'rb') as handle:
+        return pd.read_csv(_BoundedReader(handle, end), dtype=SALES_SCHEMA, usecols=usecols, parse_dates=parse_dates)
+
+
+# Read the export chunk_size rows at a time, file after file, so at most one chunk is held in memory
+def iter_sales_chunks(path=DATA_PATH, columns=None, chunk_size=None):
+    for file in sales_files(path):
+        yield from read_csv_chunks(file, columns, chunk_size)
+
+
+# The last FINGERPRINT_SIZE bytes before end
+def file_fingerprint(path, end):
+    with open(path, 'rb') as file:
+        file.seek(max(end - FINGERPRINT_SIZE, 0))
+        return file.read(min(end, FINGERPRINT_SIZE))
+
+
+# Number of CSV fields on a line
+def _field_count(line):
+    return len(next(csv.reader([line.decode('utf-8', 'replace').rstrip('\r\n')]), []))
+
+
+# Offset just past the last complete line before end, so a line still being written is left for later.
+# A last line without a newline is complete once it has the header's number of fields: exports written without
+# a final newline keep their last row
+def complete_lines_end(path, start, end):
+    with open(path, 'rb') as file:
+        header = file.readline()
+        line_start, block_end = start, end
+        while block_end > start:
+            block_start = max(block_end - 65536, start)
+            file.seek(block_start)
+            newline = file.read(block_end - block_start).rfind(b'\n')
+            if newline >= 0:
+                line_start = block_start + newline + 1
+                break
+            block_end = block_start
+        if line_start in (0, end):
+            return line_start
+        file.seek(line_start)
+        return end if _field_count(file.read(end - line_start)) == _field_count(header) else line_start
+
+
+# Whether a line break follows offset, i.e. an unterminated last line read up to there was not written further
+def line_break_at(path, offset):
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        return file.read(1) in (b'\n', b'\r')
+
+
+# File object reading at most limit bytes from handle's position
+class _BoundedReader:
+    def __init__(self, handle, limit):
+        self.handle = handle
+        self.limit = limit
+
+    def read(self, size=-1):
+        size = self.limit if size is None or size < 0 else min(size, self.limit)
+        data = self.handle.read(size)
+        self.limit -= len(data)
+        return data
+
+
+# Chunks of the rows between byte offsets start and end (defaults: the whole file). start must be the
+# beginning of a line; rows after the header take its column names
+def read_csv_chunks(path, columns=None, chunk_size=None, start=0, end=None):
+    usecols = None if columns is None else list(columns)
+    parse_dates = ['Date'] if usecols is None or 'Date' in usecols else False
+    with open(path, 'rb') as handle:
+        names = pd.read_csv(handle, nrows=0).columns.tolist()
+        if start:
+            handle.seek(start)
+        else:
+            handle.seek(0)
+            handle.readline()
+        limit = (os.path.getsize(path) if end is None else end) - handle.tell()
+        if limit <= 0:
+            return
+        with pd.read_csv(_BoundedReader(handle, limit), header=None, names=names, dtype=SALES_SCHEMA, usecols=usecols,
+                         parse_dates=parse_dates, chunksize=chunk_size or DEFAULT_CHUNK_SIZE) as reader:
+            yield from reader
+
+
+class ReservoirSample:
+    # Uniform sample of at most size rows from a stream of frames (Algorithm R, one chunk at a time).
+    # The seed is fixed so the same export always gives the same sample
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+        self.parts = []
+        self.rows = None
+
+    def add(self, chunk):
+        chunk = chunk.reset_index(drop=True)
+        # While the reservoir is filling, rows are kept as they come
+        free = max(self.size - self.seen, 0)
+        if free:
+            self.parts.append(chunk.iloc[:free])
+        rest = np.arange(min(free, len(chunk)), len(chunk))
+        if len(rest):
+            if self.rows is None:
+                self.rows = pd.concat(self.parts, ignore_index=True)
+                self.parts = []
+            # Row number i replaces a random slot with probability size / (i + 1); later rows win a slot
+            slots = self.rng.integers(0, self.seen + rest + 1)
+            kept = slots < self.size
+            slots, rest = slots[kept][::-1], rest[kept][::-1]
+            slots, first = np.unique(slots, return_index=True)
+            for column in self.rows.columns:
+                self.rows.loc[slots, column] = chunk[column].to_numpy()[rest[first]]
+        self.seen += len(chunk)
+
+    def frame(self):
+        if self.rows is None:
+            return pd.concat(self.parts, ignore_index=True) if self.parts else pd.DataFrame()
+        return self.rows
+
+
+# Write the frame as an uncompressed Arrow IPC file so later starts can memory-map it
+def write_snapshot(store_data, path, signature):
+    snapshot = store_data.copy()
+    for column in DICTIONARY_COLUMNS + ['Month']:
+        snapshot[column] = snapshot[column].astype('category')
+    table = pa.Table.from_pandas(snapshot, preserve_index=False)
+    source = f'{signature[0]}:{signature[1]}'.encode()
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), SNAPSHOT_SOURCE_KEY: source})
+
+    # Write to a temporary file first so a concurrent reader never sees a half-written snapshot
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+# Memory-map the snapshot and read only the requested columns; None if it is missing or stale.
+# The dictionary columns and Month come back as categoricals, so compact_store_data has nothing left to encode
+def read_snapshot(path, signature, columns=None):
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+        metadata = table.schema.metadata or {}
+        if metadata.get(SNAPSHOT_SOURCE_KEY) != f'{signature[0]}:{signature[1]}'.encode():
+            return None
+        if columns is not None:
+            table = table.select(list(columns))
+        return table.to_pandas(split_blocks=True)
+
+
+# Shrink the frame: categorical dimensions and the narrowest numeric types that hold every value.
+# Money columns only leave float64 when they are all whole numbers, since float32 would round sums
+def compact_store_data(store_data):
+    store_data = store_data.copy()
+    for column in store_data.columns:
+        values = store_data[column]
+        if column in CATEGORICAL_COLUMNS and isinstance(values.dtype, pd.CategoricalDtype):
+            # Already encoded (e.g. read from the snapshot): only unused categories are dropped and the rest sorted
+            codes = values.cat.codes.to_numpy()
+            used = np.bincount(codes[codes >= 0], minlength=len(values.cat.categories)) > 0
+            if not used.all():
+                values = values.cat.remove_unused_categories()
+            categories = sorted(values.cat.categories)
+            if list(values.cat.categories) != categories:
+                values = values.cat.reorder_categories(categories)
+            store_data[column] = values.cat.as_ordered() if column == 'Year' else values.cat.as_unordered()
+        elif column in CATEGORICAL_COLUMNS:
+            categories = sorted(values.dropna().unique())
+            store_data[column] = pd.Categorical(values, categories=categories, ordered=column == 'Year')
+        elif column == 'Month' and isinstance(values.dtype, pd.CategoricalDtype):
+            store_data[column] = values.cat.set_categories(MONTHS, ordered=True)
+        elif column == 'Month':
+            store_data[column] = pd.Categorical(values.astype(str), categories=MONTHS, ordered=True)
+        elif pd.api.types.is_integer_dtype(values) or (pd.api.types.is_float_dtype(values) and values.notna().all()
+                                                       and np.array_equal(values, np.floor(values))):
+            store_data[column] = pd.to_numeric(values, downcast='integer')
+    return store_data
+
+
+# Rows of store_data followed by new_rows, with the categoricals' categories merged in compact_store_data's order
+def append_store_data(store_data, new_rows):
+    combined = {}
+    for column in store_data.columns:
+        values, new_values = store_data[column], new_rows[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = values.cat.categories
+            if column != 'Month':
+                categories = sorted(set(categories) | set(new_values.dropna().unique()))
+            dtype = pd.CategoricalDtype(categories, ordered=values.cat.ordered)
+            values, new_values = values.astype(dtype), new_values.astype(dtype)
+        combined[column] = pd.concat([values, new_values], ignore_index=True)
+    return pd.DataFrame(combined)
+
+
+# Load the requested columns, converting the CSV (its first end bytes, if given) to a snapshot the first time
+# it is seen. attrs['max_date'] records the latest Date, even when Date itself is not among the columns
+def read_store_data(path, signature, columns=None, end=None):
+    snapshot = snapshot_path(path)
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + ['Date']))
+    store_data = read_snapshot(snapshot, signature, read_columns)
+    if store_data is None:
+        store_data = read_sales_csv(path, end=end)
+        try:
+            write_snapshot(store_data, snapshot, signature)
+            # Read back, so the first start gets the same frame, and memory figures, as the later ones
+            store_data = read_snapshot(snapshot, signature, read_columns)
+        except OSError:
+            # Read-only deployments keep working from the CSV
+            pass
+    max_date = store_data['Date'].max()
+    if columns is not None:
+        store_data = store_data[list(columns)]
+
+    # Data adjustments
+    memory_before = int(store_data.memory_usage(deep=True).sum())
+    store_data = compact_store_data(store_data)
+    store_data.attrs['memory_usage'] = {'before': memory_before, 'after': int(store_data.memory_usage(deep=True).sum())}
+    store_data.attrs['version'] = f'{signature[0]}:{signature[1]}'
+    store_data.attrs['max_date'] = max_date
+    return store_data
@@ -0,0 +1,147 @@
+import folium
+from folium.plugins import MarkerCluster
+import streamlit as st
+
+# Map data
+country_coordinates = {
+    'All Countries': [0, 0],  # Default location for All Countries
+    'Australia': [-25.2744, 133.7751],
+    'Canada': [56.1304, -106.3468],
+    'France': [46.6035, 1.888334],
+    'Germany': [51.1657, 10.4515],
+    'United Kingdom': [55.3781, -3.4360],
+    'United States': [37.0902, -95.7129]
+    # Add more countries and coordinates as needed
+}
+
+# Manually specified coordinates for the states
+state_coordinates = {
+    'All States': [0, 0],  # Default location for All States
+    'Alabama': [32.806671, -86.791130],
+    'Alberta': [53.9333, -116.5765],
+    'Arizona': [33.7298, -111.4312],
+    'Bayern': [48.7904, 11.4979],
+    'Brandenburg': [52.3001, 12.6159],
+    'British Columbia': [53.7267, -127.6476],
+    'California': [36.7783, -119.4179],
+    'Charente-Maritime': [45.7500, -0.9994],
+    'England': [52.3555, -1.1743],
+    'Essonne': [48.4487, 2.3195],
+    'Florida': [27.9944, -81.7603],
+    'Garonne (Haute)': [43.6465, 0.8858],
+    'Georgia': [32.1574, -82.9071],
+    'Hamburg': [53.5511, 9.9937],
+    'Hauts de Seine': [48.8566, 2.3522],
+    'Hessen': [51.1657, 9.6216],
+    'Illinois': [40.3495, -88.9861],
+    'Kentucky': [37.6681, -84.6701],
+    'Loir et Cher': [47.4037, 1.3972],
+    'Loiret': [47.9794, 2.2519],
+    'Massachusetts': [42.4072, -71.3824],
+    'Minnesota': [46.7296, -94.6859],
+    'Mississippi': [32.7416, -89.6787],
+    'Missouri': [38.4561, -92.2884],
+    'Montana': [46.9219, -110.4544],
+    'Moselle': [49.1193, 6.1727],
+    'New South Wales': [-31.8402, 145.6128],
+    'New York': [40.7128, -74.0060],
+    'Nord': [50.6927, 3.1751],
+    'Nordrhein-Westfalen': [51.4332, 7.6616],
+    'North Carolina': [35.7596, -79.0193],
+    'Ohio': [40.4173, -82.9071],
+    'Ontario': [51.2538, -85.3232],
+    'Oregon': [43.8041, -120.5542],
+    'Pas de Calais': [50.5879, 2.9522],
+    'Queensland': [-20.9176, 142.7028],
+    'Saarland': [49.3964, 7.0229],
+    'Seine (Paris)': [48.8566, 2.3522],
+    'Seine et Marne': [48.8414, 2.8128],
+    'Seine Saint Denis': [48.9382, 2.3801],
+    'Somme': [49.9762, 2.5375],
+    'South Australia': [-30.0002, 136.2092],
+    'South Carolina': [33.8361, -81.1637],
+    'Tasmania': [-41.4545, 145.9707],
+    'Texas': [31.9686, -99.9018],
+    'Utah': [39.3200, -111.0937],
+    'Val de Marne': [48.7904, 2.4068],
+    'Val d\'Oise': [49.0720, 2.1445],
+    'Victoria': [-36.7789, 144.6970],
+    'Virginia': [37.4316, -78.6569],
+    'Washington': [47.7511, -120.7401],
+    'Wyoming': [43.0750, -107.2903],
+    'Yveline': [48.7718, 1.9659]
+    # Add more states and coordinates as needed
+}
+
+
+# Function to format currency values in the popup
+def format_currency(value, color):
+    return f'<span style="color: {color}; font-weight: bold;">${value:,.0f}</span>'
+
+
+# Revenue/Profit/Cost totals for every country and state, from one grouped pass over the cube
+def compute_geo_summary(sales_cube):
+    measures = ['Revenue', 'Profit', 'Cost']
+    location_totals = sales_cube.rollup({}, ['Country', 'State'], measures)
+    country_totals = location_totals.groupby(level='Country', observed=True).sum()
+    state_totals = location_totals.groupby(level='State', observed=True).sum()
+
+    # Locations without sales still get a marker, showing zeros
+    country_totals = country_totals.reindex([c for c in country_coordinates if c != 'All Countries'], fill_value=0)
+    state_totals = state_totals.reindex([s for s in state_coordinates if s != 'All States'], fill_value=0)
+    return country_totals, state_totals
+
+
+def build_sales_map_html(country_totals, state_totals):
+    # Create a base map centered at a location
+    all_coordinates = list(country_coordinates.values()) + list(state_coordinates.values())
+    min_lat, min_lon = min(c[0] for c in all_coordinates), min(c[1] for c in all_coordinates)
+    max_lat, max_lon = max(c[0] for c in all_coordinates), max(c[1] for c in all_coordinates)
+
+    center_lat, center_lon = ((min_lat + max_lat) / 2)-30, (min_lon + max_lon) / 2
+
+    mymap = folium.Map(location=[center_lat, center_lon], zoom_start=2)
+
+    # Create a MarkerCluster to handle overlapping markers
+    marker_cluster = MarkerCluster().add_to(mymap)
+
+    # Add markers for countries with profit information
+    for country, totals in country_totals.iterrows():
+        # Enhanced popup content with larger font size and styling
+        popup_content = f"""
+        <div style="font-size: 16px; padding: 10px; background-color: white; border-radius: 5px; box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);">
+            <strong>{country}</strong><br>
+            Revenue: {format_currency(totals['Revenue'], 'blue')}<br>
+            Profit: {format_currency(totals['Profit'], 'green')}<br>
+            Expenses: {format_currency(totals['Cost'], 'red')}<br>
+        </div>
+        """
+
+        folium.Marker(location=country_coordinates[country],
+                      popup=folium.Popup(popup_content, max_width=300),
+                      icon=folium.Icon(color='blue', icon_color='black', icon='glyphicon glyphicon-globe')).add_to(marker_cluster)
+
+    # Add markers for states with profit information
+    for state, totals in state_totals.iterrows():
+        # Enhanced popup content with larger font size and styling
+        popup_content = f"""
+        <div style="font-size: 16px; padding: 10px; background-color: white; border-radius: 5px; box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);">
+            <strong>{state}</strong><br>
+            Revenue: {format_currency(totals['Revenue'], 'blue')}<br>
+            Profit: {format_currency(totals['Profit'], 'green')}<br>
+            Expenses: {format_currency(totals['Cost'], 'red')}<br>
+        </div>
+        """
+
+        folium.Marker(location=state_coordinates[state],
+                      popup=folium.Popup(popup_content, max_width=300),
+                      icon=folium.Icon(color='green', icon_color='#FFFFFF', icon='glyphicon glyphicon-home')).add_to(marker_cluster)
+
+    # Save the map to HTML as a string
+    return mymap._repr_html_()
+
+
+# The map only ever shows unfiltered totals, so it is built once per dataset version
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_sales_map_html(_sales_cube, version):
+    return build_sales_map_html(*compute_geo_summary(_sales_cube))
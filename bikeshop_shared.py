@@ -0,0 +1,187 @@
+# Shared dataset mode: one process loads the export and publishes the dataset -- the rows, the cube cells
+# and the row positions of their filter engines -- as uncompressed Arrow IPC files in a version directory.
+# Every server process then memory-maps those files read-only, so all of them (and all their sessions)
+# use the same pages of the page cache instead of each parsing and holding its own copy.
+#
+#   BIKESHOP_SHARED_DIR=/dev/shm/bikeshop streamlit run bikeshopforstreamlit_Main.py
+#   python -m bikeshop_shared [path] --shared-dir /dev/shm/bikeshop    (publish ahead of starting the servers)
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from bikeshop_analytics import (DASHBOARD_COLUMNS, EMPTY_POSITIONS, SHARED_DIR, FilterEngine, SalesCube,
+                                SalesDataSource, position_dtype)
+from bikeshop_data import CHUNK_SIZE, DATA_PATH, SAMPLE_SIZE, file_signature
+
+# Files of a published version: each frame next to the row positions of its filter engine
+SHARED_FRAMES = ['store_data', 'cells', 'age_cells', 'time_cells']
+
+# Schema metadata keys
+ATTRS_KEY = b'bikeshop_attrs'
+BOUNDS_KEY = b'bikeshop_bounds'
+
+# Published versions kept besides the newest, for processes still attached to them
+KEEP_VERSIONS = 1
+
+
+def _version_directory(shared_dir, version):
+    return os.path.join(shared_dir, version.replace(':', '-'))
+
+
+def _write_table(table, path):
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+# The table of an Arrow IPC file, its buffers pointing into the memory map (which stays open as long as they do)
+def _map_table(path):
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+# The frame as a table; categoricals become dictionary arrays, so their codes map back without copying
+def _frame_table(frame, attrs=None):
+    plain = frame.copy(deep=False)
+    plain.attrs = {}
+    table = pa.Table.from_pandas(plain, preserve_index=False)
+    if attrs is not None:
+        table = table.replace_schema_metadata({**table.schema.metadata, ATTRS_KEY: json.dumps(attrs).encode()})
+    return table
+
+
+# An engine's position arrays laid end to end in one column, with each value's [start, end) in the metadata
+def _positions_table(engine):
+    arrays, bounds, start = [], {}, 0
+    for dimension, value_positions in engine.positions.items():
+        bounds[dimension] = {}
+        for value, positions in value_positions.items():
+            arrays.append(positions)
+            bounds[dimension][value] = [start, start + len(positions)]
+            start += len(positions)
+    positions = np.concatenate(arrays) if arrays else EMPTY_POSITIONS
+    table = pa.table({'positions': positions.astype(position_dtype(len(engine.frame)), copy=False)})
+    return table.replace_schema_metadata({BOUNDS_KEY: json.dumps(bounds).encode()})
+
+
+def _attach_engine(directory, name):
+    frame = _map_table(os.path.join(directory, f'{name}.arrow')).to_pandas(split_blocks=True)
+    table = _map_table(os.path.join(directory, f'{name}.positions.arrow'))
+    positions = table.column('positions').chunk(0).to_numpy() if table.num_rows else EMPTY_POSITIONS
+    bounds = json.loads(table.schema.metadata[BOUNDS_KEY])
+    return FilterEngine(frame, positions={
+        dimension: {value: positions[start:end] for value, (start, end) in value_bounds.items()}
+        for dimension, value_bounds in bounds.items()
+    })
+
+
+# Write the dataset under shared_dir as the version of its store_data. The files are written to a temporary
+# directory that is renamed into place, so a version directory is always complete
+def publish_dataset(shared_dir, dataset):
+    store_data, sales_cube, filter_engine = dataset
+    directory = _version_directory(shared_dir, store_data.attrs['version'])
+    if os.path.isdir(directory):
+        return directory
+    attrs = {**store_data.attrs, 'max_date': None if pd.isna(store_data.attrs.get('max_date')) else
+             pd.Timestamp(store_data.attrs['max_date']).isoformat()}
+    engines = {'store_data': filter_engine, 'cells': sales_cube.engine, 'age_cells': sales_cube.age_engine,
+               'time_cells': sales_cube.time_rollups.engines['D']}
+
+    tmp_directory = f'{directory}.{os.getpid()}.tmp'
+    os.makedirs(tmp_directory, exist_ok=True)
+    for name in SHARED_FRAMES:
+        engine = engines[name]
+        _write_table(_frame_table(engine.frame, attrs if name == 'store_data' else None),
+                     os.path.join(tmp_directory, f'{name}.arrow'))
+        _write_table(_positions_table(engine), os.path.join(tmp_directory, f'{name}.positions.arrow'))
+    os.rename(tmp_directory, directory)
+    _remove_old_versions(shared_dir, directory)
+    return directory
+
+
+# Unlinking files another process has mapped is safe: its mapping stays valid until it lets go of it
+def _remove_old_versions(shared_dir, current):
+    versions = sorted((entry for entry in os.scandir(shared_dir) if entry.is_dir() and entry.path != current),
+                      key=lambda entry: entry.stat().st_mtime_ns)
+    for entry in versions[:max(len(versions) - KEEP_VERSIONS, 0)]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+# (store_data, sales_cube, filter_engine) of a published version, every array a read-only view of its files
+def attach_dataset(directory):
+    filter_engine = _attach_engine(directory, 'store_data')
+    store_data = filter_engine.frame
+    metadata = _map_table(os.path.join(directory, 'store_data.arrow')).schema.metadata
+    attrs = json.loads(metadata[ATTRS_KEY])
+    if attrs.get('max_date') is not None:
+        attrs['max_date'] = pd.Timestamp(attrs['max_date'])
+    store_data.attrs.update(attrs)
+    sales_cube = SalesCube(engines=tuple(_attach_engine(directory, name) for name in SHARED_FRAMES[1:]))
+    return store_data, sales_cube, filter_engine
+
+
+class SharedSalesSource:
+    # SalesDataSource counterpart for the shared mode, with the same refresh(). When the export changes, the
+    # first process to notice loads and publishes the new version while holding a lock file, and the others
+    # wait for it and attach. Changes are always loaded in full, and the cube is always the pandas one
+    def __init__(self, path=DATA_PATH, columns=None, shared_dir=SHARED_DIR, chunk_size=CHUNK_SIZE,
+                 sample_size=SAMPLE_SIZE):
+        self.path = path
+        self.columns = None if columns is None else list(columns)
+        self.shared_dir = shared_dir
+        self.chunk_size = chunk_size
+        self.sample_size = sample_size
+        self.dataset = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        signature = file_signature(self.path)
+        version = f'{signature[0]}:{signature[1]}'
+        dataset = self.dataset
+        if dataset is not None and dataset[0].attrs['version'] == version:
+            return dataset
+        # While one session attaches the new version the others keep using the current one
+        if not self._lock.acquire(blocking=dataset is None):
+            return dataset
+        try:
+            if self.dataset is dataset:
+                self.dataset = attach_dataset(self._published(version))
+            return self.dataset
+        finally:
+            self._lock.release()
+
+    # Directory of the version, publishing it first unless another process already has
+    def _published(self, version):
+        directory = _version_directory(self.shared_dir, version)
+        if os.path.isdir(directory):
+            return directory
+        os.makedirs(self.shared_dir, exist_ok=True)
+        with open(os.path.join(self.shared_dir, '.publish.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.isdir(directory):
+                return directory
+            # The export may have changed again since version was read; publish what was actually loaded
+            return publish_dataset(self.shared_dir, self.load())
+
+    def load(self):
+        return SalesDataSource(self.path, self.columns, self.chunk_size, self.sample_size, backend='pandas').refresh()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Publish the dataset for the shared dataset mode')
+    parser.add_argument('path', nargs='?', default=DATA_PATH)
+    parser.add_argument('--shared-dir', default=SHARED_DIR or '/dev/shm/bikeshop')
+    args = parser.parse_args()
+    source = SharedSalesSource(args.path, DASHBOARD_COLUMNS, args.shared_dir)
+    store_data, _, _ = source.refresh()
+    print(f'{len(store_data):,} rows published to {_version_directory(args.shared_dir, store_data.attrs["version"])}')
+
+
+if __name__ == '__main__':
+    main()
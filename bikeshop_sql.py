@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from bikeshop_analytics import (CUBE_DIMENSIONS, CUBE_MEASURES, FILTER_DIMENSIONS, CellAccumulator, TimeRollups,
+                                _ignored_dimensions, categorical_cells, merge_cube_cells, time_cells)
+from bikeshop_data import MONTHS
+
+# Columns of the sales table: the cube dimensions as text, the age, the measures, and each row's insertion
+# number, which lets every cube version see only the rows it was built from
+SQL_DIMENSIONS = CUBE_DIMENSIONS
+SQL_COLUMNS = SQL_DIMENSIONS + ['Customer_Age'] + CUBE_MEASURES
+
+
+def _quote(name):
+    return f'"{name}"'
+
+
+# Plain values for the SQL drivers: categoricals back to their category type, dimensions as text
+def _plain_rows(rows, start):
+    plain = {}
+    for column in SQL_COLUMNS:
+        values = rows[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(values.cat.categories.dtype)
+        plain[column] = values.astype(str) if column in SQL_DIMENSIONS else values
+    plain['_row'] = np.arange(start, start + len(rows), dtype=np.int64)
+    return pd.DataFrame(plain)
+
+
+# Whether compact_store_data would store the column as integers
+def _whole_numbers(values):
+    return pd.api.types.is_integer_dtype(values) or (pd.api.types.is_float_dtype(values) and values.notna().all()
+                                                     and np.array_equal(values, np.floor(values)))
+
+
+# Result labels back to the in-memory types, in the order pandas sorts categoricals: calendar months,
+# numeric years, everything else alphabetically
+def _dimension_labels(dimension, values):
+    if dimension == 'Year':
+        values = values.astype(np.int64)
+        return pd.Categorical(values, categories=sorted(values.unique()), ordered=True)
+    if dimension == 'Month':
+        return pd.Categorical(values, categories=[month for month in MONTHS if month in set(values)], ordered=True)
+    return pd.Categorical(values, categories=sorted(values.unique()))
+
+
+# Prefix of the database files of an export: next to it, like its snapshot, or in the temporary directory
+# when the export's directory is read-only
+def database_prefix(path):
+    prefix = os.path.splitext(os.path.abspath(path.rstrip(os.sep)))[0]
+    if not os.access(os.path.dirname(prefix), os.W_OK):
+        prefix = os.path.join(tempfile.gettempdir(), os.path.basename(prefix))
+    return prefix
+
+
+def _remove_database(connection, path):
+    connection.close()
+    for file in (path, f'{path}.wal', f'{path}-journal'):
+        if os.path.exists(file):
+            os.remove(file)
+
+
+class SQLDatabase:
+    # One embedded database holding the sales table. With a prefix it lives in a file of its own named after
+    # it, removed with the object, so the table can outgrow memory; without one it is held in memory.
+    # DuckDB hands every query its own cursor; SQLite connections are not safe to share, so its queries take turns
+    def __init__(self, backend, prefix=None):
+        if backend not in ('duckdb', 'sqlite'):
+            raise ValueError(f'Unknown query backend: {backend}')
+        self.backend = backend
+        self.rows = 0
+        self._lock = threading.Lock()
+        self.path = ':memory:'
+        if prefix is not None:
+            descriptor, self.path = tempfile.mkstemp(prefix=f'{os.path.basename(prefix)}.', suffix=f'.{backend}',
+                                                     dir=os.path.dirname(prefix))
+            # Only the unique name is kept: the drivers create the file themselves
+            os.close(descriptor)
+            os.remove(self.path)
+        if backend == 'duckdb':
+            import duckdb
+            self.connection = duckdb.connect(self.path)
+        else:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            # The file is a throwaway copy of the export: no journal, no syncs
+            self.connection.execute('PRAGMA journal_mode = OFF')
+            self.connection.execute('PRAGMA synchronous = OFF')
+        if prefix is not None:
+            weakref.finalize(self, _remove_database, self.connection, self.path)
+
+        columns = [f'{_quote(column)} TEXT' for column in SQL_DIMENSIONS]
+        columns += [f'{_quote("Customer_Age")} BIGINT'] + [f'{_quote(measure)} DOUBLE' for measure in CUBE_MEASURES]
+        columns += ['"_row" BIGINT']
+        self.connection.execute(f'CREATE TABLE sales ({", ".join(columns)})')
+        if backend == 'sqlite':
+            # DuckDB prunes with its min/max zone maps; SQLite needs indexes on the filter columns
+            for dimension in FILTER_DIMENSIONS:
+                self.connection.execute(f'CREATE INDEX sales_{dimension.lower()} ON sales ({_quote(dimension)})')
+
+    # Append rows and return the new row count
+    def insert(self, rows):
+        plain = _plain_rows(rows, self.rows)
+        with self._lock:
+            if self.backend == 'duckdb':
+                self.connection.register('new_rows', plain)
+                self.connection.execute('INSERT INTO sales SELECT * FROM new_rows')
+                self.connection.unregister('new_rows')
+            else:
+                placeholders = ', '.join('?' * len(plain.columns))
+                self.connection.executemany(f'INSERT INTO sales VALUES ({placeholders})',
+                                            plain.astype(object).itertuples(index=False, name=None))
+                self.connection.commit()
+            self.rows += len(plain)
+        return self.rows
+
+    def query(self, sql, params):
+        if self.backend == 'duckdb':
+            return self.connection.cursor().execute(sql, params).df()
+        with self._lock:
+            return pd.read_sql_query(sql, self.connection, params=params)
+
+
+class SQLSalesCube:
+    # Same interface as SalesCube, answered by GROUP BY queries pushed down to DuckDB or SQLite.
+    # Results match the pandas cube: the same labels in the same order, integer sums for measures that
+    # only ever held whole numbers. The time rollups are the in-memory ones: they are already summed per day.
+    # The rows come as store_data or as an iterable of chunks; with a prefix the database is a file (see SQLDatabase)
+    def __init__(self, store_data=None, backend='duckdb', database=None, rows=0, integer_measures=None,
+                 time_rollups=None, chunks=(), prefix=None):
+        self.database = database or SQLDatabase(backend, prefix)
+        self.rows = rows
+        self.integer_measures = integer_measures if integer_measures is not None else set(CUBE_MEASURES)
+        self.time_rollups = time_rollups
+        self._insert([store_data] if store_data is not None else chunks)
+        self._summarise()
+
+    # Insert the chunks one at a time, then fold their days into the time rollups once
+    def _insert(self, chunks):
+        accumulator = CellAccumulator()
+        for chunk in chunks:
+            self.integer_measures = {measure for measure in self.integer_measures if _whole_numbers(chunk[measure])}
+            self.rows = self.database.insert(chunk)
+            accumulator.add((time_cells(chunk),))
+        parts = accumulator.parts()
+        if not parts:
+            return
+        if self.time_rollups is not None:
+            parts.insert(0, (self.time_rollups.daily_cells(),))
+        (daily,) = categorical_cells(merge_cube_cells(*parts))
+        self.time_rollups = TimeRollups(cells=daily)
+
+    def _summarise(self):
+        # Category of every product, for chart labels
+        products = self._select(['Product'], {}, ['Product_Category'], aggregate='MIN')
+        self.product_categories = products['Product_Category']
+
+        # Unfiltered profit per country, ranked once per dataset for the business metrics
+        self.country_profit = self.rollup({}, 'Country', 'Profit')
+
+    # Cube of the rows counted so far plus the frames in chunks; the old version keeps answering for its own rows
+    def extended(self, chunks):
+        return SQLSalesCube(database=self.database, rows=self.rows, integer_measures=self.integer_measures,
+                            time_rollups=self.time_rollups, chunks=chunks)
+
+    def _where(self, selection, ignore):
+        ignored = _ignored_dimensions(ignore)
+        conditions, params = ['"_row" < ?'], [self.rows]
+        for dimension in FILTER_DIMENSIONS:
+            if selection.get(dimension) is not None and dimension not in ignored:
+                conditions.append(f'{_quote(dimension)} = ?')
+                params.append(str(selection[dimension]))
+        return ' AND '.join(conditions), params
+
+    def _measure_sql(self, measure, aggregate):
+        if measure == 'Rows':
+            return 'COUNT(*)'
+        if aggregate != 'SUM':
+            return f'{aggregate}({_quote(measure)})'
+        sql_type = 'BIGINT' if measure in self.integer_measures else 'DOUBLE'
+        return f'CAST(COALESCE(SUM({_quote(measure)}), 0) AS {sql_type})'
+
+    # One GROUP BY query, returned as a frame indexed by the group columns in pandas' sort order
+    def _select(self, by, selection, measures, ignore=(), aggregate='SUM'):
+        where, params = self._where(selection, ignore)
+        columns = [f'{self._measure_sql(measure, aggregate)} AS {_quote(measure)}' for measure in measures]
+        group = ', '.join(_quote(column) for column in by)
+        sql = f'SELECT {group}, {", ".join(columns)} FROM sales WHERE {where} GROUP BY {group}'
+        result = self.database.query(sql, params)
+        if by == ['Customer_Age']:
+            index = pd.Index(result['Customer_Age'].astype(np.int64), name='Customer_Age')
+        else:
+            labels = [_dimension_labels(column, result[column]) for column in by]
+            index = (pd.MultiIndex.from_arrays(labels, names=by) if len(by) > 1
+                     else pd.CategoricalIndex(labels[0], name=by[0]))
+        frame = result[measures].set_axis(index)
+        for measure in measures:
+            if measure == 'Rows' or (aggregate == 'SUM' and measure in self.integer_measures):
+                frame[measure] = frame[measure].astype(np.int64)
+        return frame.sort_index()
+
+    # Totals of measures (a name or a list) for the selection, grouped by the by dimension(s) if given
+    def rollup(self, selection, by=None, measures=CUBE_MEASURES + ['Rows'], ignore=()):
+        measure_list = [measures] if isinstance(measures, str) else list(measures)
+        if by is None:
+            where, params = self._where(selection, ignore)
+            columns = ', '.join(f'{self._measure_sql(measure, "SUM")} AS {_quote(measure)}' for measure in measure_list)
+            totals = self.database.query(f'SELECT {columns} FROM sales WHERE {where}', params)
+            return pd.Series({measure: totals[measure].iloc[0] for measure in measure_list})
+        frame = self._select([by] if isinstance(by, str) else list(by), selection, measure_list, ignore)
+        return frame[measures]
+
+    # Number of customers at each distinct age for the selection, indexed by age
+    def age_counts(self, selection, ignore=()):
+        return self._select(['Customer_Age'], selection, ['Rows'], ignore)['Rows']
+
+    # Values of dimension that still have sales under the selection, in category order
+    def options(self, dimension, selection=None, ignore=()):
+        return [str(value) for value in self._select([dimension], selection or {}, ['Rows'], ignore).index]
@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from bikeshop_analytics import scanned_rows
+
+# Section render timings are logged as one JSON object per line. BIKESHOP_TIMINGS_LOG sets the level the
+# logger lets through, e.g. WARNING to switch them off
+logger = logging.getLogger('bikeshop.timings')
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(os.environ.get('BIKESHOP_TIMINGS_LOG', 'INFO'))
+    logger.propagate = False
+
+TIMING_COLUMNS = ['wall_ms', 'aggregation_ms', 'figure_ms', 'rows_scanned', 'payload_bytes']
+
+
+# Bytes of a chart as sent to the browser: PNGs as they are, Plotly figures as their JSON spec
+def payload_size(figure):
+    if isinstance(figure, bytes):
+        return len(figure)
+    return len(figure.to_json())
+
+
+class RenderTimings:
+    # Timings of the sections drawn in one script run: wall time, the part of it spent computing aggregates
+    # and the part spent building figures, the rows (or cube cells) the filter engines read, and the bytes of
+    # chart data sent to the browser. Cache hits show up as near-zero aggregation and figure times
+    def __init__(self, context=None):
+        self.context = context or {}
+        self.records = []
+        self._current = None
+
+    @contextmanager
+    def section(self, name):
+        record = dict.fromkeys(TIMING_COLUMNS, 0)
+        outer, self._current = self._current, record
+        rows_before, started = scanned_rows(), time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall_ms'] = (time.perf_counter() - started) * 1000
+            record['rows_scanned'] = scanned_rows() - rows_before
+            self._current = outer
+            self.records.append({'section': name, **record})
+            logger.info(json.dumps({'event': 'section_render', 'section': name, **self.context,
+                                    **{column: round(value, 3) for column, value in record.items()}}))
+
+    # Time spent in the block counts towards the current section's '<name>_ms' ('aggregation' or 'figure')
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._current is not None:
+                self._current[f'{name}_ms'] += (time.perf_counter() - started) * 1000
+
+    def add_payload(self, size):
+        if self._current is not None:
+            self._current['payload_bytes'] += size
+
+    def frame(self):
+        return pd.DataFrame(self.records, columns=['section'] + TIMING_COLUMNS).set_index('section')
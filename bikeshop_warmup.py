@@ -0,0 +1,144 @@
+# Warm the caches before the first user arrives. The dashboard page is run headlessly (Streamlit's AppTest)
+# for the default view and the most common filter combinations, with every tab and every lazily drawn
+# expander opened once. That loads the dataset and fills the aggregate, figure and map caches through the
+# same code, and under the same keys, as a real session.
+# Those caches live in the server process, so 'serve' warms up first and then starts the Streamlit server in
+# the same process: the port only opens, and the ready file only appears, once warm-up is done.
+#
+#   python -m bikeshop_warmup serve [--selections warmup.json] [--usage-log timings.log] [--top 10]
+#                                   [--ready-file /tmp/bikeshop.ready] [streamlit run options...]
+#   python -m bikeshop_warmup warm [...]    (warm-up only: time a cold start, or publish the shared dataset)
+#
+# warmup.json lists filter combinations as {dimension: value} objects, e.g. [{"Country": "Germany"}].
+# The usage log is the JSON lines written by the 'bikeshop.timings' logger; the most frequent filters in it
+# are warmed after the configured ones.
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from bikeshop_analytics import FILTER_DIMENSIONS
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bikeshopforstreamlit_Main.py')
+
+# Filter combinations taken from the usage log. The default keeps everything warmed within the aggregate and
+# figure cache sizes
+WARMUP_TOP = int(os.environ.get('BIKESHOP_WARMUP_TOP', '10'))
+WARMUP_SELECTIONS = os.environ.get('BIKESHOP_WARMUP_SELECTIONS', '')
+WARMUP_USAGE_LOG = os.environ.get('BIKESHOP_WARMUP_USAGE_LOG', '')
+READY_FILE = os.environ.get('BIKESHOP_READY_FILE', '')
+
+# Sidebar selectbox of each filter dimension, in the order the page shows them
+SIDEBAR_FILTERS = {
+    'Country': 'Select Country',
+    'State': 'Select State',
+    'Product_Category': 'Select Product Category',
+    'Sub_Category': 'Select Sub-Category',
+    'Year': 'Filter by Year',
+    'Month': 'Filter by Month',
+}
+
+
+def _normalized(selection):
+    return tuple((dimension, str(selection[dimension])) for dimension in FILTER_DIMENSIONS
+                 if selection.get(dimension) is not None)
+
+
+def configured_selections(path):
+    with open(path) as file:
+        return [_normalized(selection) for selection in json.load(file)]
+
+
+# The top most frequent filter combinations among the section renders of a timings log
+def usage_selections(path, top=WARMUP_TOP):
+    counts = Counter()
+    with open(path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get('event') == 'section_render':
+                counts[_normalized(record.get('filters', {}))] += 1
+    return [selection for selection, _ in counts.most_common(top)]
+
+
+# The default view first, then the configured combinations, then the most used ones, without repeats
+def warmup_selections(selections_path=WARMUP_SELECTIONS, usage_log=WARMUP_USAGE_LOG, top=WARMUP_TOP):
+    selections = [()]
+    if selections_path:
+        selections += configured_selections(selections_path)
+    if usage_log and os.path.exists(usage_log):
+        selections += usage_selections(usage_log, top)
+    return [dict(selection) for selection in dict.fromkeys(selections)]
+
+
+# Run the page for one filter combination with every tab and expander open. False if the sidebar doesn't
+# offer one of its values (e.g. a configured country missing from the current export)
+def warm_page(selection, app_path=APP_PATH, timeout=600):
+    from streamlit.testing.v1 import AppTest
+
+    page = AppTest.from_file(app_path, default_timeout=timeout)
+    page.run()
+    for dimension, label in SIDEBAR_FILTERS.items():
+        if dimension not in selection:
+            continue
+        selectbox = next((widget for widget in page.selectbox if widget.label == label), None)
+        if selectbox is None or selection[dimension] not in selectbox.options:
+            return False
+        selectbox.select_index(selectbox.options.index(selection[dimension]))
+        page.run()
+
+    for tab in [tab.label for tab in page.tabs]:
+        page.session_state['dashboard_section'] = tab
+        page.run()
+        closed = [expander.key for expander in page.expander if expander.key and not page.session_state[expander.key]]
+        if closed:
+            # The tabs report their own state on every rerun, so the open tab is set again with the expanders
+            page.session_state['dashboard_section'] = tab
+            for key in closed:
+                page.session_state[key] = True
+            page.run()
+        if page.exception:
+            raise RuntimeError(f'{tab} failed to render for {selection}: {page.exception[0].value}')
+    return True
+
+
+def warm_up(selections, app_path=APP_PATH, timeout=600):
+    started = time.perf_counter()
+    for selection in selections:
+        page_started = time.perf_counter()
+        warmed = warm_page(selection, app_path, timeout)
+        print(f'{"warmed" if warmed else "skipped"} {selection or "default view"} '
+              f'in {time.perf_counter() - page_started:.1f}s', flush=True)
+    print(f'warm-up done in {time.perf_counter() - started:.1f}s', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Warm the dashboard caches, then optionally start the server')
+    parser.add_argument('command', choices=['warm', 'serve'])
+    parser.add_argument('--selections', default=WARMUP_SELECTIONS, help='JSON list of filter combinations')
+    parser.add_argument('--usage-log', default=WARMUP_USAGE_LOG, help='timings log to take the common filters from')
+    parser.add_argument('--top', type=int, default=WARMUP_TOP)
+    parser.add_argument('--ready-file', default=READY_FILE, help='created once warm-up is done')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds allowed per page run')
+    args, streamlit_options = parser.parse_known_args()
+
+    if args.ready_file and os.path.exists(args.ready_file):
+        os.remove(args.ready_file)
+    warm_up(warmup_selections(args.selections, args.usage_log, args.top), timeout=args.timeout)
+    if args.ready_file:
+        with open(args.ready_file, 'w') as file:
+            file.write(f'{time.time()}\n')
+
+    if args.command == 'serve':
+        from streamlit.web import cli
+
+        sys.argv = ['streamlit', 'run', APP_PATH] + streamlit_options
+        sys.exit(cli.main())
+
+
+if __name__ == '__main__':
+    main()